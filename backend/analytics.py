@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from sketches import CHAPTER_HLL_PRECISION, COURSE_HLL_PRECISION, ViewSketch
+
+logger = logging.getLogger(__name__)
+
+# View analytics configuration
+VIEW_FLUSH_SECONDS = float(os.environ.get('VIEW_FLUSH_SECONDS', '30'))
+VIEW_FLUSH_RETRIES = 5
+MAX_ANALYTICS_DAYS = 90
+
+def sketch_key(course_id: str, day: str, chapter_id: Optional[str] = None) -> str:
+    if chapter_id is None:
+        return f"course:{course_id}:{day}"
+    return f"chapter:{course_id}:{chapter_id}:{day}"
+
+def new_sketch(chapter: bool = False) -> ViewSketch:
+    return ViewSketch(CHAPTER_HLL_PRECISION if chapter else COURSE_HLL_PRECISION)
+
+class ViewTracker:
+    """Accumulates view sketches in memory and merges them into storage.
+
+    Each worker keeps one sketch per course/day and chapter/day it has
+    seen since its last flush. Flushing merges every sketch into the
+    stored blob with a compare-and-set on the blob's revision, so workers
+    never overwrite each other's counts.
+    """
+
+    def __init__(self, storage, flush_seconds: float = VIEW_FLUSH_SECONDS):
+        self.storage = storage
+        self.flush_seconds = flush_seconds
+        self._pending: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def record(self, course_id: str, student_id: str, chapter_id: Optional[str] = None, day: Optional[str] = None):
+        day = day or datetime.utcnow().date().isoformat()
+        with self._lock:
+            self._sketch(course_id, day).record(student_id)
+            if chapter_id is not None:
+                self._sketch(course_id, day, chapter_id).record(student_id)
+
+    def _sketch(self, course_id: str, day: str, chapter_id: Optional[str] = None) -> ViewSketch:
+        key = sketch_key(course_id, day, chapter_id)
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = (course_id, day, new_sketch(chapter=chapter_id is not None))
+            self._pending[key] = entry
+        return entry[2]
+
+    def flush(self):
+        """Merge every pending sketch into storage.
+
+        Sketches that cannot be written, because the compare-and-set keeps
+        losing or storage fails, go back to the pending set for the next
+        flush; a storage error is re-raised after that.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        unwritten = dict(pending)
+        try:
+            for key, (course_id, day, sketch) in pending.items():
+                if self._write(key, course_id, day, sketch):
+                    del unwritten[key]
+        finally:
+            self._requeue(unwritten)
+
+    def _write(self, key: str, course_id: str, day: str, sketch: ViewSketch) -> bool:
+        for _ in range(VIEW_FLUSH_RETRIES):
+            stored = self.storage.get_view_sketch(key)
+            merged = sketch
+            revision = None
+            if stored is not None:
+                blob, revision = stored
+                merged = ViewSketch.from_bytes(blob)
+                merged.merge(sketch)
+                # Older course blobs carry a count-min table of chapter views;
+                # the chapter sketches now count those exactly
+                merged.chapters = None
+            if self.storage.put_view_sketch(key, course_id, day, merged.to_bytes(), revision):
+                return True
+        return False
+
+    def _requeue(self, entries: Dict[str, tuple]):
+        with self._lock:
+            for key, (course_id, day, sketch) in entries.items():
+                entry = self._pending.get(key)
+                if entry is not None:
+                    sketch.merge(entry[2])
+                self._pending[key] = (course_id, day, sketch)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await run_in_threadpool(self.flush)
+            except Exception:
+                logger.exception("View sketch flush failed; retrying in %ss", self.flush_seconds)
+
+    def load(self, keys: List[str]) -> Dict[str, ViewSketch]:
+        """Stored sketches merged with this worker's unflushed views, in one read"""
+        sketches = {key: new_sketch(chapter=not key.startswith("course:")) for key in keys}
+        for key, blob in self.storage.get_view_sketches(keys).items():
+            sketches[key].merge(ViewSketch.from_bytes(blob))
+        with self._lock:
+            for key in keys:
+                entry = self._pending.get(key)
+                if entry is not None:
+                    sketches[key].merge(entry[2])
+        return sketches
+
+    def summary(self, course: dict, days: int) -> dict:
+        today = datetime.utcnow().date()
+        day_list = [(today - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+        chapter_ids = [
+            chapter["id"]
+            for section in course.get("sections", [])
+            for chapter in section.get("chapters", [])
+        ]
+        course_keys = [sketch_key(course["id"], day) for day in day_list]
+        chapter_keys = [sketch_key(course["id"], day, chapter_id) for chapter_id in chapter_ids for day in day_list]
+        sketches = self.load(course_keys + chapter_keys)
+
+        total = new_sketch()
+        per_day = []
+        for day, key in zip(day_list, course_keys):
+            sketch = sketches[key]
+            total.merge(sketch)
+            per_day.append({"day": day, "views": sketch.views, "unique_learners": sketch.learners.count()})
+
+        chapters = []
+        for chapter_id in chapter_ids:
+            chapter_total = new_sketch(chapter=True)
+            for day in day_list:
+                chapter_total.merge(sketches[sketch_key(course["id"], day, chapter_id)])
+            chapters.append({
+                "chapter_id": chapter_id,
+                "views": chapter_total.views,
+                "unique_learners": chapter_total.learners.count(),
+            })
+
+        return {
+            "course_id": course["id"],
+            "days": per_day,
+            "views": total.views,
+            "unique_learners": total.learners.count(),
+            "chapters": chapters,
+            "error_bounds": {
+                "course_unique_learners_relative_std_error": round(total.learners.standard_error, 4),
+                "chapter_unique_learners_relative_std_error": round(new_sketch(chapter=True).learners.standard_error, 4),
+            },
+        }
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Benchmark the related-courses model on a synthetic catalog.
+
+Usage: python benchmarks/bench_related_courses.py [--courses 100000]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recommendations import RelatedCoursesModel
+
+def synthetic_courses(count: int, vocabulary_size: int, seed: int = 42):
+    """Courses whose words follow a Zipf distribution, like real titles do"""
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(vocabulary_size)]
+    for _ in range(count):
+        def text(length):
+            ranks = np.minimum(rng.zipf(1.3, size=length), vocabulary_size) - 1
+            return " ".join(words[rank] for rank in ranks)
+        yield {
+            "id": str(uuid.uuid4()),
+            "title": text(6),
+            "description": text(40),
+            "instructor_name": "bench",
+            "sections": [{"chapters": [{"title": text(5)} for _ in range(8)]}],
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--courses", type=int, default=100_000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+
+    courses = list(synthetic_courses(args.courses, args.vocabulary))
+    model = RelatedCoursesModel()
+
+    start = time.perf_counter()
+    model.build(courses)
+    build_seconds = time.perf_counter() - start
+    print(f"Full rebuild: {args.courses} courses, {len(model.vocabulary)} terms, "
+          f"{model.matrix.nnz} non-zeros in {build_seconds:.2f}s")
+
+    new_courses = list(synthetic_courses(args.updates, args.vocabulary, seed=7))
+    start = time.perf_counter()
+    for course in new_courses:
+        model.upsert(course)
+    upsert_ms = (time.perf_counter() - start) * 1000 / args.updates
+    print(f"Incremental publish: {upsert_ms:.2f} ms per course")
+
+    ids = [course["id"] for course in courses]
+    start = time.perf_counter()
+    for i in range(args.lookups):
+        model.related(ids[i % len(ids)], 5)
+    lookup_us = (time.perf_counter() - start) * 1_000_000 / args.lookups
+    print(f"Lookup: {lookup_us:.1f} us per request")
+
+if __name__ == "__main__":
+    main()
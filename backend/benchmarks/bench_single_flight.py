@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Spike benchmark: database loads per second as concurrent readers grow.
+
+Usage: python benchmarks/bench_single_flight.py [--clients 10 100 1000 10000]
+
+Every client reads the same course in a loop. The load sleeps for
+``--latency-ms`` to stand in for find_one plus the Course build, and
+counts how often it runs. Each level runs once through SingleFlight and
+once with a plain thread-pool load per request for comparison.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.concurrency import run_in_threadpool
+
+from singleflight import SingleFlight
+
+class CountingLoader:
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000.0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return b'{"id": "hot-course"}'
+
+async def spike(clients: int, duration: float, latency_ms: float, ttl_ms: float, coalesce: bool):
+    loader = CountingLoader(latency_ms)
+    flight = SingleFlight(ttl_ms=ttl_ms)
+    served = 0
+    deadline = time.monotonic() + duration
+
+    async def client():
+        nonlocal served
+        while time.monotonic() < deadline:
+            if coalesce:
+                await flight.get("hot-course", loader)
+            else:
+                await run_in_threadpool(loader)
+            served += 1
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return served / duration, loader.calls / duration, flight.stats()
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--ttl-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'mode':>14} {'requests/s':>12} {'db loads/s':>11} {'coalesced':>10} {'hits':>10}")
+    for clients in args.clients:
+        for coalesce in (False, True):
+            requests, loads, stats = await spike(clients, args.duration, args.latency_ms, args.ttl_ms, coalesce)
+            mode = "single-flight" if coalesce else "direct"
+            coalesced = stats["coalesced"] if coalesce else "-"
+            hits = stats["hits"] if coalesce else "-"
+            print(f"{clients:>8} {mode:>14} {requests:>12.0f} {loads:>11.1f} {coalesced:>10} {hits:>10}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Run the same storage workload against each backend and compare throughput.
+
+Usage: python benchmarks/bench_storage.py --backend sqlite --backend mongo [--backend mariadb]
+
+MongoDB uses MONGO_URL and a separate ``elearning_bench`` database; MariaDB
+uses the DB_* variables and should point at a scratch database with
+database_schema.sql applied. SQLite runs in a temporary file.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import create_storage
+
+def open_storage(backend: str, workdir: str):
+    if backend == "sqlite":
+        from storage.sql import SQLiteDialect, SQLStorage
+        return SQLStorage(SQLiteDialect(os.path.join(workdir, "bench.db")))
+    if backend == "mongo":
+        from storage.mongo import MongoStorage
+        url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/elearning_db')
+        storage = MongoStorage(url, database="elearning_bench")
+        storage.client.drop_database("elearning_bench")
+        return storage
+    return create_storage(backend)
+
+def make_users(count: int):
+    now = datetime.utcnow()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "username": f"user-{uuid.uuid4().hex}",
+            "email": f"{uuid.uuid4().hex}@bench.test",
+            "password": "$2b$12$" + "x" * 53,
+            "role": random.choice(["student", "instructor"]),
+            "full_name": "Bench User",
+            "created_at": now,
+            "is_active": True,
+        }
+        for _ in range(count)
+    ]
+
+def make_course(instructor: dict, sections: int, chapters: int) -> dict:
+    now = datetime.utcnow()
+    return {
+        "id": str(uuid.uuid4()),
+        "title": "Benchmark course",
+        "description": "A course generated by the storage benchmark",
+        "instructor_id": instructor["id"],
+        "instructor_name": instructor["full_name"],
+        "thumbnail": None,
+        "price": 19.99,
+        "is_published": random.random() < 0.5,
+        "published_version": None,
+        "created_at": now,
+        "updated_at": now,
+        "sections": [
+            {
+                "id": str(uuid.uuid4()),
+                "title": f"Section {s}",
+                "description": None,
+                "order": s,
+                "created_at": now,
+                "chapters": [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "title": f"Chapter {c}",
+                        "description": "Chapter description",
+                        "video_url": None,
+                        "chapter_type": "free",
+                        "price": None,
+                        "order": c,
+                        "created_at": now,
+                    }
+                    for c in range(chapters)
+                ],
+            }
+            for s in range(sections)
+        ],
+    }
+
+def timed(label: str, operations: int, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {operations:>7} ops  {elapsed:8.3f}s  {operations / elapsed:10.0f} ops/s")
+
+def run(backend: str, args):
+    print(f"{backend}:")
+    random.seed(1)
+    with tempfile.TemporaryDirectory() as workdir:
+        storage = open_storage(backend, workdir)
+        storage.setup()
+
+        users = make_users(args.users)
+        batches = [users[i:i + 1000] for i in range(0, len(users), 1000)]
+        timed("insert users (batches)", len(users), lambda: [storage.insert_users(batch) for batch in batches])
+
+        sample = random.sample(users, min(len(users), 1000))
+        timed("existing users lookup", len(sample), lambda: storage.existing_users(
+            [user["email"] for user in sample], [user["username"] for user in sample]))
+        timed("get user by email", args.reads, lambda: [
+            storage.get_user_by_email(random.choice(users)["email"]) for _ in range(args.reads)])
+
+        instructors = users[:max(1, len(users) // 100)]
+        courses = [make_course(random.choice(instructors), args.sections, args.chapters) for _ in range(args.courses)]
+        timed("insert course trees", len(courses), lambda: [storage.insert_course(course) for course in courses])
+        timed("get course", args.reads, lambda: [
+            storage.get_course(random.choice(courses)["id"]) for _ in range(args.reads)])
+        timed("list instructor courses", len(instructors), lambda: [
+            storage.list_instructor_courses(instructor["id"]) for instructor in instructors])
+        timed("list published courses", 1, lambda: list(storage.list_published_courses()))
+        timed("update course", args.reads, lambda: [
+            storage.update_course(random.choice(courses)["id"], {"updated_at": datetime.utcnow()})
+            for _ in range(args.reads)])
+        storage.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", action="append", choices=["sqlite", "mongo", "mariadb"])
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--courses", type=int, default=1_000)
+    parser.add_argument("--sections", type=int, default=5)
+    parser.add_argument("--chapters", type=int, default=8)
+    parser.add_argument("--reads", type=int, default=2_000)
+    args = parser.parse_args()
+
+    for backend in args.backend or ["sqlite"]:
+        run(backend, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Check the view sketches against their stated error bounds.
+
+Usage: python benchmarks/check_sketch_accuracy.py [--cardinalities 100 10000 100000] [--trials 5]
+
+Feeds known numbers of distinct learners and a skewed stream of chapter
+views into the sketches and compares the estimates with the exact
+counts. Exits non-zero when a bound is violated:
+
+- HyperLogLog errors have an RMS within the stated standard error over
+  ``--trials`` runs, up to the chi-square spread of so few runs, and no
+  single run is off by 4 standard errors; both limits allow one learner
+  of integer rounding, which dominates at small cardinalities
+- count-min estimates never undercount, and overcount by more than
+  (e / width) * total views for at most a fraction e^-depth of chapters
+- merging sketches built on separate workers and days gives exactly the
+  sketch of the combined stream, before and after a round trip through
+  ``to_bytes``
+"""
+import argparse
+import math
+import os
+import random
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from scipy.stats import chi2
+
+from sketches import CHAPTER_HLL_PRECISION, COURSE_HLL_PRECISION, CountMinSketch, HyperLogLog, ViewSketch
+
+def hyperloglog_limits(standard_error: float, cardinality: int, trials: int):
+    """RMS and worst-case relative error limits that hold for 99.9% of runs"""
+    rounding = 1 / cardinality
+    rms = standard_error * math.sqrt(chi2.ppf(0.999, trials) / trials) + rounding
+    return rms, 4 * standard_error + rounding
+
+def check_hyperloglog(precision: int, cardinalities, trials: int, seed: int) -> bool:
+    ok = True
+    bound = HyperLogLog(precision).standard_error
+    for cardinality in cardinalities:
+        errors = []
+        for trial in range(trials):
+            sketch = HyperLogLog(precision)
+            for index in range(cardinality):
+                sketch.add(f"learner-{seed}-{trial}-{index}")
+            # Re-adding the same learners must not change the estimate
+            for index in range(0, cardinality, 3):
+                sketch.add(f"learner-{seed}-{trial}-{index}")
+            errors.append(sketch.count() / cardinality - 1)
+        rms = float(np.sqrt(np.mean(np.square(errors))))
+        worst = float(np.max(np.abs(errors)))
+        rms_limit, worst_limit = hyperloglog_limits(bound, cardinality, trials)
+        passed = rms <= rms_limit and worst <= worst_limit
+        ok &= passed
+        print(f"  p={precision:<3} n={cardinality:>8} rms error={rms:6.2%} (limit {rms_limit:5.2%}) "
+              f"worst={worst:6.2%} (limit {worst_limit:5.2%}) {'ok' if passed else 'FAIL'}")
+    return ok
+
+def check_count_min(views: int, chapters: int, seed: int) -> bool:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(chapters)]
+    stream = rng.choices([f"chapter-{index}" for index in range(chapters)], weights, k=views)
+    exact = Counter(stream)
+    sketch = CountMinSketch()
+    for chapter_id in stream:
+        sketch.add(chapter_id)
+
+    limit = sketch.epsilon * views
+    undercounts = 0
+    over_limit = 0
+    worst = 0
+    for chapter_id, count in exact.items():
+        overcount = sketch.estimate(chapter_id) - count
+        undercounts += overcount < 0
+        over_limit += overcount > limit
+        worst = max(worst, overcount)
+    failure_rate = over_limit / len(exact)
+    passed = undercounts == 0 and failure_rate <= sketch.delta
+    print(f"  views={views} chapters={len(exact)} worst overcount={worst} limit={limit:.0f} "
+          f"over limit={failure_rate:.2%} allowed={sketch.delta:.2%} {'ok' if passed else 'FAIL'}")
+    return passed
+
+def check_merge(views: int, seed: int) -> bool:
+    rng = random.Random(seed)
+    events = [(f"learner-{rng.randrange(views // 4)}", f"chapter-{rng.randrange(200)}") for _ in range(views)]
+    combined = ViewSketch(COURSE_HLL_PRECISION, with_chapters=True)
+    for learner, chapter_id in events:
+        combined.record(learner, chapter_id)
+
+    # Four workers over three days, each flushed as a blob and merged back
+    merged = ViewSketch(COURSE_HLL_PRECISION, with_chapters=True)
+    for part in range(12):
+        worker = ViewSketch(COURSE_HLL_PRECISION, with_chapters=True)
+        for learner, chapter_id in events[part::12]:
+            worker.record(learner, chapter_id)
+        merged.merge(ViewSketch.from_bytes(worker.to_bytes()))
+
+    passed = (
+        merged.views == combined.views
+        and np.array_equal(merged.learners.registers, combined.learners.registers)
+        and np.array_equal(merged.chapters.table, combined.chapters.table)
+    )
+    print(f"  views={views} merged from 12 blobs identical to one sketch: {'ok' if passed else 'FAIL'}")
+    return passed
+
+def report_sizes():
+    full = ViewSketch(COURSE_HLL_PRECISION, with_chapters=True)
+    for index in range(200000):
+        full.record(f"learner-{index}", f"chapter-{index % 300}")
+    sizes = {
+        "course sketch, empty": ViewSketch(COURSE_HLL_PRECISION, with_chapters=True),
+        "course sketch, 200k views": full,
+        "chapter sketch, empty": ViewSketch(CHAPTER_HLL_PRECISION),
+    }
+    for name, sketch in sizes.items():
+        memory = sketch.learners.registers.nbytes + (sketch.chapters.table.nbytes if sketch.chapters is not None else 0)
+        print(f"  {name:<26} memory={memory:>6} B  blob={len(sketch.to_bytes()):>6} B")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cardinalities", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--views", type=int, default=200000)
+    parser.add_argument("--chapters", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    ok = True
+    print("HyperLogLog unique learners")
+    ok &= check_hyperloglog(COURSE_HLL_PRECISION, args.cardinalities, args.trials, args.seed)
+    ok &= check_hyperloglog(CHAPTER_HLL_PRECISION, args.cardinalities, args.trials, args.seed)
+    print("Count-min chapter views")
+    ok &= check_count_min(args.views, args.chapters, args.seed)
+    print("Merge across workers and days")
+    ok &= check_merge(args.views, args.seed)
+    print("Memory per key")
+    report_sizes()
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
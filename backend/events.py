@@ -0,0 +1,108 @@
+import asyncio
+import json
+import os
+from collections import deque
+from datetime import datetime
+from itertools import count
+from typing import Dict, List, Set
+
+# Server-sent events configuration
+EVENT_BUFFER_SIZE = int(os.environ.get('EVENT_BUFFER_SIZE', '100'))
+EVENT_KEEPALIVE_SECONDS = float(os.environ.get('EVENT_KEEPALIVE_SECONDS', '15'))
+EVENT_RETRY_MS = 5000
+
+class Subscription:
+    """One connection's bounded buffer of pending events.
+
+    When a slow client lets the buffer fill up, the oldest events are
+    discarded and the client is told to resync with a full refetch.
+    """
+
+    def __init__(self, topic: str, buffer_size: int = EVENT_BUFFER_SIZE):
+        self.topic = topic
+        self.pending = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def push(self, event: dict):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(event)
+        self._ready.set()
+
+    async def next_batch(self, timeout: float = EVENT_KEEPALIVE_SECONDS) -> List[dict]:
+        """Wait for events; returns an empty list when the timeout passes first"""
+        if not self.pending:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._ready.clear()
+        batch = list(self.pending)
+        self.pending.clear()
+        if self.dropped:
+            batch.insert(0, {"id": None, "type": "resync", "data": {"dropped": self.dropped}})
+            self.dropped = 0
+        return batch
+
+class EventBroker:
+    """In-process fan-out of events to every connection subscribed to a topic.
+
+    Topics are instructor ids. ``publish`` only appends to in-memory
+    buffers, so it must be called from the event loop and never blocks.
+    """
+
+    def __init__(self, buffer_size: int = EVENT_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._ids = count(1)
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(topic, self.buffer_size)
+        self._subscriptions.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.topic)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.topic]
+
+    def publish(self, topic: str, event_type: str, data: dict):
+        subscriptions = self._subscriptions.get(topic)
+        if not subscriptions:
+            return
+        event = {
+            "id": next(self._ids),
+            "type": event_type,
+            "data": {**data, "timestamp": datetime.utcnow().isoformat()},
+        }
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    def connection_count(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+def format_sse(event: dict) -> str:
+    lines = []
+    if event["id"] is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event['data'], default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+async def event_stream(broker: EventBroker, topic: str):
+    """Yield SSE frames for ``topic`` until the client disconnects"""
+    subscription = broker.subscribe(topic)
+    try:
+        yield f"retry: {EVENT_RETRY_MS}\n\n"
+        while True:
+            batch = await subscription.next_batch()
+            if not batch:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            yield "".join(format_sse(event) for event in batch)
+    finally:
+        broker.unsubscribe(subscription)
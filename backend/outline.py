@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+# Largest batch accepted by PATCH /api/courses/{course_id}
+OUTLINE_MAX_OPERATIONS = 500
+
+SECTION_FIELDS = ("title", "description", "order")
+CHAPTER_FIELDS = ("title", "description", "video_url", "chapter_type", "price", "order")
+
+class OutlineError(Exception):
+    """An operation that cannot be applied to the current outline"""
+
+    def __init__(self, message: str, status_code: int = 422):
+        super().__init__(message)
+        self.status_code = status_code
+
+def version_timestamp(value: datetime) -> datetime:
+    """``updated_at`` as sent by a client, in the naive UTC the storage holds"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _milliseconds(value: datetime) -> datetime:
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+def version_now() -> datetime:
+    """``updated_at`` for a new course.
+
+    Course versions have millisecond precision, the finest Mongo stores
+    and what courses.updated_at holds on MariaDB, so every backend reads
+    back exactly the value that was written.
+    """
+    return _milliseconds(datetime.utcnow())
+
+def next_version(previous: datetime) -> datetime:
+    """``updated_at`` for a course edit, strictly later than ``previous``"""
+    return max(version_now(), _milliseconds(previous) + timedelta(milliseconds=1))
+
+def _target(operation: dict, index: int) -> Tuple[str, str]:
+    section_id = operation.get("section_id")
+    chapter_id = operation.get("chapter_id")
+    if (section_id is None) == (chapter_id is None):
+        raise OutlineError(f"Operation {index}: give exactly one of section_id or chapter_id")
+    return ("chapter", chapter_id) if chapter_id is not None else ("section", section_id)
+
+def _insert(items: list, item: dict, position: Optional[int]):
+    if position is None or position > len(items):
+        position = len(items)
+    items.insert(position, item)
+
+class _Outline:
+    """Mutable copy of a course's sections with id lookups"""
+
+    def __init__(self, sections: List[dict]):
+        self.sections = [
+            {**section, "chapters": [dict(chapter) for chapter in section.get("chapters", [])]}
+            for section in sections
+        ]
+        self.section_by_id = {section["id"]: section for section in self.sections}
+        self.parent_by_chapter = {
+            chapter["id"]: section for section in self.sections for chapter in section["chapters"]
+        }
+
+    def section(self, section_id: str, index: int) -> dict:
+        section = self.section_by_id.get(section_id)
+        if section is None:
+            raise OutlineError(f"Operation {index}: section {section_id} not found", 404)
+        return section
+
+    def chapter(self, chapter_id: str, index: int) -> Tuple[dict, dict]:
+        parent = self.parent_by_chapter.get(chapter_id)
+        if parent is None:
+            raise OutlineError(f"Operation {index}: chapter {chapter_id} not found", 404)
+        chapter = next(chapter for chapter in parent["chapters"] if chapter["id"] == chapter_id)
+        return parent, chapter
+
+    def apply(self, operation: dict, index: int):
+        op = operation["op"]
+        if op == "move":
+            parent, chapter = self.chapter(operation["chapter_id"], index)
+            destination = self.section(operation["section_id"], index)
+            parent["chapters"].remove(chapter)
+            _insert(destination["chapters"], chapter, operation.get("position"))
+            self.parent_by_chapter[chapter["id"]] = destination
+        elif op == "reorder":
+            kind, item_id = _target(operation, index)
+            if kind == "section":
+                section = self.section(item_id, index)
+                self.sections.remove(section)
+                _insert(self.sections, section, operation["position"])
+            else:
+                parent, chapter = self.chapter(item_id, index)
+                parent["chapters"].remove(chapter)
+                _insert(parent["chapters"], chapter, operation["position"])
+        elif op == "rename":
+            kind, item_id = _target(operation, index)
+            item = self.section(item_id, index) if kind == "section" else self.chapter(item_id, index)[1]
+            for field in ("title", "description"):
+                if operation.get(field) is not None:
+                    item[field] = operation[field]
+        elif op == "delete":
+            kind, item_id = _target(operation, index)
+            if kind == "section":
+                section = self.section(item_id, index)
+                self.sections.remove(section)
+                del self.section_by_id[item_id]
+                for chapter in section["chapters"]:
+                    del self.parent_by_chapter[chapter["id"]]
+            else:
+                parent, chapter = self.chapter(item_id, index)
+                parent["chapters"].remove(chapter)
+                del self.parent_by_chapter[item_id]
+        elif op == "reprice":
+            _, chapter = self.chapter(operation["chapter_id"], index)
+            chapter["chapter_type"] = operation["chapter_type"]
+            chapter["price"] = operation.get("price") if operation["chapter_type"] == "paid" else None
+        else:
+            raise OutlineError(f"Operation {index}: unknown op {op}")
+
+    def compact(self):
+        for section_order, section in enumerate(self.sections):
+            section["order"] = section_order
+            for chapter_order, chapter in enumerate(section["chapters"]):
+                chapter["order"] = chapter_order
+
+def _diff(old_sections: List[dict], new_sections: List[dict]) -> dict:
+    old_section_by_id = {section["id"]: section for section in old_sections}
+    old_chapters = {
+        chapter["id"]: (section["id"], chapter)
+        for section in old_sections for chapter in section.get("chapters", [])
+    }
+    changes = {"sections": set(), "chapters": set(), "deleted_sections": set(), "deleted_chapters": set()}
+    for section in new_sections:
+        old = old_section_by_id[section["id"]]
+        chapter_ids = [chapter["id"] for chapter in section["chapters"]]
+        if (any(section.get(field) != old.get(field) for field in SECTION_FIELDS)
+                or chapter_ids != [chapter["id"] for chapter in old.get("chapters", [])]):
+            changes["sections"].add(section["id"])
+        for chapter in section["chapters"]:
+            old_parent, old_chapter = old_chapters[chapter["id"]]
+            if old_parent != section["id"] or any(
+                chapter.get(field) != old_chapter.get(field) for field in CHAPTER_FIELDS
+            ):
+                changes["chapters"].add(chapter["id"])
+                changes["sections"].add(section["id"])
+
+    kept_chapters = {chapter["id"] for section in new_sections for chapter in section["chapters"]}
+    changes["deleted_sections"] = set(old_section_by_id) - {section["id"] for section in new_sections}
+    changes["deleted_chapters"] = set(old_chapters) - kept_chapters
+    return changes
+
+def apply_outline_operations(sections: List[dict], operations: List[dict]) -> Tuple[List[dict], dict]:
+    """Apply move/reorder/rename/delete/reprice operations in order.
+
+    Returns the new sections, with ``order`` compacted to 0..n-1 at every
+    level, and the ids that changed: ``sections`` and ``chapters`` to
+    rewrite (a section counts as changed when any of its chapters does)
+    plus ``deleted_sections`` and ``deleted_chapters``. ``sections`` is
+    not modified.
+    """
+    outline = _Outline(sections)
+    for index, operation in enumerate(operations):
+        outline.apply(operation, index)
+    outline.compact()
+    return outline.sections, _diff(sections, outline.sections)
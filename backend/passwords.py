@@ -0,0 +1,10 @@
+import bcrypt
+
+# Kept free of server imports: bulk provisioning sends hash_password to
+# worker processes, which import this module rather than the whole app.
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
@@ -0,0 +1,323 @@
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import Context, ContextVar
+from typing import Callable, Optional
+
+import bson
+from pymongo import monitoring
+
+# Profiling configuration
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+# Oldest profiles are deleted once the directory holds more than this
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '200'))
+PROFILE_HEADER = b'x-profile'
+
+# Slow operation log configuration (0 disables it)
+SLOW_OP_MS = float(os.environ.get('SLOW_OP_MS', '0'))
+SLOW_OP_LOG = os.environ.get('SLOW_OP_LOG')
+
+slow_log = logging.getLogger("slow_ops")
+
+# Leaf frames that only mean a thread is parked waiting for work
+_IDLE_MODULES = ("threading.py", "queue.py", "selectors.py")
+
+# Set for the duration of a profiled request; anyio copies it into the
+# context each threadpool job runs in
+_profiled_request: ContextVar[Optional[object]] = ContextVar("profiled_request", default=None)
+# The loop in anyio's worker threads, whose ``context`` local is the job's
+_WORKER_RUN = os.path.join("anyio", "_backends", "_asyncio.py")
+
+def configure_slow_log(path: Optional[str] = SLOW_OP_LOG):
+    """Send slow operation records to a file (or stderr) as JSON lines"""
+    handler = logging.FileHandler(path) if path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    slow_log.addHandler(handler)
+    slow_log.setLevel(logging.WARNING)
+    slow_log.propagate = False
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _stack(frame) -> list:
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    return frames
+
+def request_frames(marker_frame, token) -> Callable[[list], bool]:
+    """Selects the stacks that belong to one request.
+
+    On the event loop that is any stack running through ``marker_frame``,
+    the request's own coroutine; in anyio worker threads, any job whose
+    copied context carries ``token`` in ``_profiled_request``.
+    """
+    def select(frames: list) -> bool:
+        for frame in frames:
+            if frame is marker_frame:
+                return True
+        # The worker loop sits just above the thread bootstrap frames
+        for frame in frames[-4:]:
+            code = frame.f_code
+            if code.co_name == "run" and code.co_filename.endswith(_WORKER_RUN):
+                context = frame.f_locals.get("context")
+                return isinstance(context, Context) and context.get(_profiled_request) is token
+        return False
+    return select
+
+def prune_profiles(directory: str, keep: int = PROFILE_MAX_FILES):
+    """Delete the oldest ``.folded`` files beyond ``keep``"""
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.name.endswith(".folded")]
+    except FileNotFoundError:
+        return
+    profiles = []
+    for entry in entries:
+        try:
+            profiles.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            # Pruned by another request's profiler in the meantime
+            pass
+    profiles.sort(reverse=True)
+    for _, path in profiles[keep:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+class SamplingProfiler:
+    """Samples thread stacks on a timer and aggregates collapsed stacks.
+
+    ``select`` receives each thread's frames, innermost first, and decides
+    whether the sample counts; by default every busy thread does. The
+    output is the folded format understood by flamegraph.pl, speedscope
+    and inferno: one ``root;...;leaf count`` line per distinct stack.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, select: Optional[Callable[[list], bool]] = None):
+        self.interval = interval_ms / 1000.0
+        self.select = select
+        self.stacks = Counter()
+        self._path: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, path: Optional[str] = None):
+        """Stop sampling; the profiler thread then writes ``path``, if given.
+
+        Returns without waiting, so it is safe to call on the event loop.
+        """
+        self._path = path
+        self._stop.set()
+
+    def join(self):
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self._sample(own_id)
+        if self._path is not None:
+            self.write(self._path)
+            prune_profiles(os.path.dirname(self._path) or ".")
+
+    def _sample(self, own_id: int):
+        names = None
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or frame.f_code.co_filename.endswith(_IDLE_MODULES):
+                continue
+            frames = _stack(frame)
+            if self.select is not None and not self.select(frames):
+                continue
+            if names is None:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            labels = [names.get(thread_id, str(thread_id))]
+            labels.extend(_frame_label(frame) for frame in reversed(frames))
+            self.stacks[";".join(labels)] += 1
+
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+def _is_event_stream(message) -> bool:
+    """Whether a response start message opens a server-sent events stream"""
+    for key, value in message.get("headers", []):
+        if key.lower() == b"content-type":
+            return value.startswith(b"text/event-stream")
+    return False
+
+class ProfilingMiddleware:
+    """Profiles a request when sampled or when an admin sends ``X-Profile: 1``.
+
+    Only this request's stacks are sampled: its coroutine on the event
+    loop and the threadpool jobs it starts, not other requests running
+    at the same time. Requests that are neither sampled nor carry the
+    header go straight to the application after a single header scan.
+    Event streams are only profiled up to the start of the response,
+    since they stay open for the life of the connection.
+    """
+
+    def __init__(self, app, authorize: Callable[[str], bool], directory: str = PROFILE_DIR,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.app = app
+        self.authorize = authorize
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.interval_ms = interval_ms
+
+    def _should_profile(self, scope) -> bool:
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        if _header(scope, PROFILE_HEADER) is None:
+            return False
+        authorization = (_header(scope, b'authorization') or b'').decode('latin-1')
+        scheme, _, token = authorization.partition(" ")
+        return scheme.lower() == "bearer" and self.authorize(token)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            return await self.app(scope, receive, send)
+
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{slug}-{uuid.uuid4().hex[:8]}.folded"
+        path = os.path.join(self.directory, filename)
+
+        token = object()
+        profiler = SamplingProfiler(self.interval_ms, select=request_frames(sys._getframe(), token))
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((b"x-profile-file", filename.encode()))
+                if _is_event_stream(message):
+                    profiler.stop(path)
+            await send(message)
+
+        reset = _profiled_request.set(token)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            # The profiler thread writes the file; stopping twice is harmless
+            profiler.stop(path)
+            _profiled_request.reset(reset)
+
+class SlowRequestMiddleware:
+    """Logs any request whose handler takes longer than the threshold.
+
+    Event streams are skipped: their duration is the connection's lifetime.
+    """
+
+    def __init__(self, app, threshold_ms: float = SLOW_OP_MS):
+        self.app = app
+        self.threshold_ms = threshold_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = None
+        streaming = False
+
+        async def send_with_status(message):
+            nonlocal status_code, streaming
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                streaming = _is_event_stream(message)
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if duration_ms >= self.threshold_ms and not streaming:
+                slow_log.warning(json.dumps({
+                    "kind": "request",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "duration_ms": round(duration_ms, 3),
+                }))
+
+def query_shape(value):
+    """Replace literal values with their type names so filters can be grouped"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return []
+        return [query_shape(value[0]), f"... {len(value)} items"] if len(value) > 1 else [query_shape(value[0])]
+    return type(value).__name__
+
+def _command_filter(command_name: str, command):
+    if "filter" in command:
+        return command["filter"]
+    if command_name == "update" and command.get("updates"):
+        return command["updates"][0].get("q")
+    if command_name == "delete" and command.get("deletes"):
+        return command["deletes"][0].get("q")
+    if command_name == "aggregate":
+        return command.get("pipeline")
+    if command_name == "findAndModify":
+        return command.get("query")
+    return None
+
+class SlowCommandListener(monitoring.CommandListener):
+    """Logs Mongo commands slower than the threshold with their filter shape.
+
+    Only registered when ``SLOW_OP_MS`` is set; the pending map holds each
+    in-flight command until its reply arrives.
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_OP_MS):
+        self.threshold_micros = threshold_ms * 1000
+        self._pending = {}
+
+    def started(self, event):
+        self._pending[(event.connection_id, event.request_id)] = event.command
+
+    def succeeded(self, event):
+        command = self._pending.pop((event.connection_id, event.request_id), None)
+        if event.duration_micros >= self.threshold_micros:
+            self._log(event, command, reply_bytes=len(bson.encode(event.reply)))
+
+    def failed(self, event):
+        command = self._pending.pop((event.connection_id, event.request_id), None)
+        if event.duration_micros >= self.threshold_micros:
+            self._log(event, command, failure=str(event.failure))
+
+    def _log(self, event, command, **extra):
+        record = {
+            "kind": "mongo",
+            "command": event.command_name,
+            "database": event.database_name,
+            "duration_ms": round(event.duration_micros / 1000, 3),
+        }
+        if command is not None:
+            record["collection"] = command.get(event.command_name)
+            record["filter_shape"] = query_shape(_command_filter(event.command_name, command))
+            record["command_bytes"] = len(bson.encode(command))
+        record.update(extra)
+        slow_log.warning(json.dumps(record, default=str))
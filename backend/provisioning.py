@@ -0,0 +1,244 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import types
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing.context import SpawnContext, SpawnProcess
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+# Bulk provisioning configuration
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', '1000'))
+BULK_HASH_WORKERS = int(os.environ.get('BULK_HASH_WORKERS', str(os.cpu_count() or 1)))
+
+SUPPORTED_FORMATS = ("csv", "ndjson")
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+
+class _HashWorker:
+    """Pool worker that starts without re-running the parent's main script.
+
+    Spawned and forkserver children import ``__main__`` from its file
+    before running anything, which for ``python server.py`` builds the
+    whole app (storage clients included) once per worker. Hiding it while
+    the start data is collected makes them import only what unpickling
+    the hash function needs.
+    """
+
+    def start(self):
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            super().start()
+        finally:
+            sys.modules["__main__"] = main
+
+class _SpawnHashWorker(_HashWorker, SpawnProcess):
+    pass
+
+class _SpawnHashContext(SpawnContext):
+    Process = _SpawnHashWorker
+
+if "forkserver" in multiprocessing.get_all_start_methods():
+    from multiprocessing.context import ForkServerContext, ForkServerProcess
+
+    class _ForkServerHashWorker(_HashWorker, ForkServerProcess):
+        pass
+
+    class _ForkServerHashContext(ForkServerContext):
+        Process = _ForkServerHashWorker
+
+def _hash_pool_context():
+    # Never fork: the server process already runs anyio and pymongo threads
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return _SpawnHashContext()
+    # Workers fork from a server that has bcrypt loaded, not the app
+    multiprocessing.set_forkserver_preload(["passwords", __name__])
+    return _ForkServerHashContext()
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all bulk uploads, created on first use"""
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(max_workers=BULK_HASH_WORKERS, mp_context=_hash_pool_context())
+    return _hash_pool
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Guess the upload format from its file name or content type"""
+    name = (filename or "").lower()
+    if name.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+def iter_records(stream, fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (row number, record, parse error) one line at a time from a binary stream"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for row_number, row in enumerate(csv.DictReader(text), start=1):
+            if None in row:
+                yield row_number, None, "Too many columns"
+                continue
+            yield row_number, {
+                key.strip(): value.strip()
+                for key, value in row.items()
+                if key and value is not None and value.strip() != ""
+            }, None
+    else:
+        row_number = 0
+        for line in text:
+            row_number += 1
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, None, f"Invalid JSON: {e.msg}"
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, "Row must be a JSON object"
+                continue
+            yield row_number, record, None
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def _result(row: int, email: Optional[str], status: str, detail: Optional[str] = None, user_id: Optional[str] = None) -> dict:
+    result = {"row": row, "email": email, "status": status}
+    if user_id is not None:
+        result["id"] = user_id
+    if detail is not None:
+        result["detail"] = detail
+    return result
+
+def provision_users(
+    storage,
+    records: Iterable[Tuple[int, Optional[dict], Optional[str]]],
+    model,
+    hasher: Callable[[str], str],
+    batch_size: int = BULK_BATCH_SIZE,
+    pool: Optional[Executor] = None,
+) -> Iterator[dict]:
+    """Create users batch by batch, yielding one result per row.
+
+    Each batch costs one duplicate lookup, one round of parallel password
+    hashing and one unordered batch insert. Its results are yielded in row
+    order once it is written, and the counters for the whole upload come
+    last, so neither the file nor the report is ever held in memory; only
+    the emails and usernames seen so far are kept to reject duplicates
+    within the file.
+    """
+    pool = pool or get_hash_pool()
+    counts = {"created": 0, "duplicates": 0, "invalid": 0, "errors": 0}
+    seen_emails = set()
+    seen_usernames = set()
+
+    for batch in _batched(records, batch_size):
+        results = []
+        candidates = []
+        for row, record, error in batch:
+            if error is not None:
+                results.append(_result(row, None, "invalid", error))
+                counts["invalid"] += 1
+                continue
+            try:
+                user = model(**record)
+            except ValidationError as e:
+                results.append(_result(row, record.get("email"), "invalid", e.errors()[0]["msg"]))
+                counts["invalid"] += 1
+                continue
+
+            if user.email in seen_emails:
+                results.append(_result(row, user.email, "duplicate", "Email repeated in upload"))
+                counts["duplicates"] += 1
+                continue
+            if user.username in seen_usernames:
+                results.append(_result(row, user.email, "duplicate", "Username repeated in upload"))
+                counts["duplicates"] += 1
+                continue
+            seen_emails.add(user.email)
+            seen_usernames.add(user.username)
+            candidates.append((row, user))
+
+        if candidates:
+            results.extend(_create_users(storage, candidates, hasher, pool, counts))
+        results.sort(key=lambda result: result["row"])
+        yield from results
+
+    yield counts
+
+def _create_users(storage, candidates: List[tuple], hasher: Callable[[str], str], pool: Executor,
+                  counts: dict) -> List[dict]:
+    results = []
+    # One round-trip to find everything in this batch that already exists
+    existing_emails, existing_usernames = storage.existing_users(
+        [user.email for _, user in candidates],
+        [user.username for _, user in candidates]
+    )
+
+    pending = []
+    for row, user in candidates:
+        if user.email in existing_emails:
+            results.append(_result(row, user.email, "duplicate", "Email already registered"))
+            counts["duplicates"] += 1
+        elif user.username in existing_usernames:
+            results.append(_result(row, user.email, "duplicate", "Username already taken"))
+            counts["duplicates"] += 1
+        else:
+            pending.append((row, user))
+
+    if not pending:
+        return results
+
+    workers = getattr(pool, "_max_workers", BULK_HASH_WORKERS)
+    chunksize = max(1, len(pending) // (workers * 4))
+    hashed_passwords = pool.map(hasher, [user.password for _, user in pending], chunksize=chunksize)
+
+    now = datetime.utcnow()
+    user_docs = [
+        {
+            "id": str(uuid.uuid4()),
+            "username": user.username,
+            "email": user.email,
+            "password": hashed_password,
+            "role": user.role,
+            "full_name": user.full_name,
+            "created_at": now,
+            "is_active": True
+        }
+        for (_, user), hashed_password in zip(pending, hashed_passwords)
+    ]
+
+    write_errors = storage.insert_users(user_docs)
+
+    for index, ((row, user), user_doc) in enumerate(zip(pending, user_docs)):
+        if index in write_errors:
+            results.append(_result(row, user.email, "error", write_errors[index]))
+            counts["errors"] += 1
+        else:
+            results.append(_result(row, user.email, "created", user_id=user_doc["id"]))
+            counts["created"] += 1
+    return results
+
+def ndjson_report(results: Iterable[dict], batch_size: int = BULK_BATCH_SIZE) -> Iterator[str]:
+    """Encode ``provision_users`` output as NDJSON, one chunk per batch.
+
+    Every row gets exactly one result, so with the same ``batch_size``
+    each chunk holds one written batch.
+    """
+    for batch in _batched(results, batch_size):
+        yield "".join(json.dumps(result) + "\n" for result in batch)
@@ -0,0 +1,298 @@
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+# Related courses configuration
+RELATED_TOP_K = int(os.environ.get('RELATED_TOP_K', '10'))
+RELATED_BATCH_SIZE = int(os.environ.get('RELATED_BATCH_SIZE', '256'))
+# Terms found in more than this share of courses are dropped once the
+# catalog is large enough for that to matter; they add density, not signal
+RELATED_MAX_DF = float(os.environ.get('RELATED_MAX_DF', '0.1'))
+RELATED_MAX_DF_MIN_COURSES = 100
+# Similarity batches denser than this are ranked as dense arrays
+RELATED_DENSE_THRESHOLD = 0.25
+# Full rebuild once incremental updates reach this share of the catalog
+RELATED_REBUILD_RATIO = float(os.environ.get('RELATED_REBUILD_RATIO', '0.1'))
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w\w+", re.UNICODE)
+
+def course_text(course: dict) -> str:
+    chapter_titles = [
+        chapter.get("title", "")
+        for section in course.get("sections", [])
+        for chapter in section.get("chapters", [])
+    ]
+    return " ".join([course.get("title", ""), course.get("description", ""), *chapter_titles])
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def course_card(course: dict) -> dict:
+    return {
+        "id": course["id"],
+        "title": course.get("title"),
+        "instructor_name": course.get("instructor_name"),
+        "thumbnail": course.get("thumbnail"),
+        "price": course.get("price"),
+    }
+
+class RelatedCoursesModel:
+    """TF-IDF nearest neighbours over published courses.
+
+    ``build`` vectorizes the whole catalog and fills a dense top-k table
+    (row index and cosine score per course) from batched sparse matrix
+    products. ``upsert`` folds a newly published course in with a single
+    matrix-vector product against the existing vocabulary; once enough
+    updates accumulate the model rebuilds itself from ``loader``. Builds
+    from ``loader`` run on a background thread and lookups return nothing
+    until the first one finishes; upserts that land during a build are
+    replayed on the new table.
+    """
+
+    def __init__(self, loader: Optional[Callable[[], Iterable[dict]]] = None,
+                 top_k: int = RELATED_TOP_K, batch_size: int = RELATED_BATCH_SIZE):
+        self.loader = loader
+        self.top_k = top_k
+        self.batch_size = batch_size
+        self.built = False
+        self.updates_since_build = 0
+        self._lock = threading.RLock()
+        self._building = False
+        self._queued: Dict[str, dict] = {}
+        self._reset()
+
+    def _reset(self):
+        self.ids = []
+        self.cards = []
+        self.index = {}
+        self.vocabulary = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.matrix = sp.csr_matrix((0, 0), dtype=np.float32)
+        self.neighbours = np.full((0, self.top_k), -1, dtype=np.int32)
+        self.scores = np.full((0, self.top_k), -1.0, dtype=np.float32)
+
+    def start_build(self):
+        """Rebuild from ``loader`` on a background thread unless one is running"""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._background_build, name="related-courses-build", daemon=True).start()
+
+    def _background_build(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Related courses build failed")
+        finally:
+            with self._lock:
+                self._building = False
+
+    def rebuild(self):
+        self.build(self.loader() if self.loader else [])
+
+    def build(self, courses: Iterable[dict]):
+        ids, cards, term_counts = [], [], []
+        document_frequency = Counter()
+        for course in courses:
+            counts = Counter(tokenize(course_text(course)))
+            ids.append(course["id"])
+            cards.append(course_card(course))
+            term_counts.append(counts)
+            document_frequency.update(counts.keys())
+
+        n = len(ids)
+        max_df = RELATED_MAX_DF * n if n >= RELATED_MAX_DF_MIN_COURSES else n
+        vocabulary = {}
+        idf = []
+        for term, df in document_frequency.items():
+            if df <= max_df:
+                vocabulary[term] = len(idf)
+                idf.append(math.log((1 + n) / (1 + df)) + 1)
+
+        idf = np.asarray(idf, dtype=np.float32)
+        matrix = self._vectorize(term_counts, vocabulary, idf)
+        neighbours, scores = self._top_k_table(matrix)
+
+        with self._lock:
+            self.ids = ids
+            self.cards = cards
+            self.index = {course_id: row for row, course_id in enumerate(ids)}
+            self.vocabulary = vocabulary
+            self.idf = idf
+            self.matrix = matrix
+            self.neighbours = neighbours
+            self.scores = scores
+            self.updates_since_build = 0
+            self.built = True
+
+            # Courses published after the loader read the catalog
+            queued, self._queued = self._queued, {}
+            for course in queued.values():
+                self._upsert(course)
+
+    def _vectorize(self, term_counts: List[Counter], vocabulary: dict, idf: np.ndarray) -> sp.csr_matrix:
+        indptr = [0]
+        indices = []
+        data = []
+        for counts in term_counts:
+            for term, count in counts.items():
+                column = vocabulary.get(term)
+                if column is not None:
+                    indices.append(column)
+                    data.append(1.0 + math.log(count))
+            indptr.append(len(indices))
+
+        matrix = sp.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(term_counts), len(vocabulary)),
+            dtype=np.float32,
+        )
+        matrix = matrix @ sp.diags(idf, format="csr", dtype=np.float32)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.csr_matrix(sp.diags(1.0 / norms, dtype=np.float32) @ matrix)
+
+    def _top_k_table(self, matrix: sp.csr_matrix):
+        n = matrix.shape[0]
+        neighbours = np.full((n, self.top_k), -1, dtype=np.int32)
+        scores = np.full((n, self.top_k), -1.0, dtype=np.float32)
+        k = min(self.top_k, n - 1)
+        if k <= 0:
+            return neighbours, scores
+
+        transposed = matrix.T.tocsr()
+        for start in range(0, n, self.batch_size):
+            stop = min(start + self.batch_size, n)
+            similarity = matrix[start:stop] @ transposed
+            if similarity.nnz > RELATED_DENSE_THRESHOLD * similarity.shape[0] * n:
+                top, top_scores = self._dense_top_k(similarity.toarray(), start, k)
+            else:
+                top, top_scores = self._sparse_top_k(similarity.tocsr(), start, k)
+            neighbours[start:stop, :k] = top
+            scores[start:stop, :k] = top_scores
+        return neighbours, scores
+
+    @staticmethod
+    def _dense_top_k(similarity: np.ndarray, start: int, k: int):
+        rows = np.arange(similarity.shape[0])
+        similarity[rows, rows + start] = -1.0
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarity, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    @staticmethod
+    def _sparse_top_k(similarity: sp.csr_matrix, start: int, k: int):
+        batch = similarity.shape[0]
+        top = np.full((batch, k), -1, dtype=np.int32)
+        top_scores = np.full((batch, k), -1.0, dtype=np.float32)
+
+        rows = np.repeat(np.arange(batch), np.diff(similarity.indptr))
+        keep = similarity.indices != rows + start
+        rows, columns, data = rows[keep], similarity.indices[keep], similarity.data[keep]
+
+        # Sort every row's entries by descending score, then keep each row's first k
+        order = np.lexsort((-data, rows))
+        rows, columns, data = rows[order], columns[order], data[order]
+        row_starts = np.searchsorted(rows, np.arange(batch))
+        rank = np.arange(len(rows)) - row_starts[rows]
+        selected = rank < k
+        top[rows[selected], rank[selected]] = columns[selected]
+        top_scores[rows[selected], rank[selected]] = data[selected]
+        return top, top_scores
+
+    def upsert(self, course: dict):
+        """Add or refresh one course without recomputing the whole table.
+
+        Terms the vocabulary has never seen are ignored until the next full
+        rebuild, and neighbour lists that drop the course's old score are not
+        backfilled; both are corrected by the periodic rebuild.
+        """
+        with self._lock:
+            if self._building:
+                # The running build may have read the catalog before this course
+                self._queued[course["id"]] = course
+            if not self.built:
+                # The first build loads it from the database or replays it
+                return
+            self._upsert(course)
+
+            if (self.loader and not self._building
+                    and self.updates_since_build >= max(1, RELATED_REBUILD_RATIO * len(self.ids))):
+                self.start_build()
+
+    def _upsert(self, course: dict):
+        with self._lock:
+            vector = self._vectorize([Counter(tokenize(course_text(course)))], self.vocabulary, self.idf)
+            row = self.index.get(course["id"])
+            if row is None:
+                row = len(self.ids)
+                self.ids.append(course["id"])
+                self.cards.append(course_card(course))
+                self.index[course["id"]] = row
+                self.matrix = sp.vstack([self.matrix, vector], format="csr")
+                self.neighbours = np.vstack([self.neighbours, np.full((1, self.top_k), -1, dtype=np.int32)])
+                self.scores = np.vstack([self.scores, np.full((1, self.top_k), -1.0, dtype=np.float32)])
+            else:
+                self.cards[row] = course_card(course)
+                self.matrix = sp.vstack([self.matrix[:row], vector, self.matrix[row + 1:]], format="csr")
+
+            similarity = (self.matrix @ vector.T).toarray().ravel()
+            similarity[row] = -1.0
+
+            # The course's own neighbour list
+            k = min(self.top_k, len(self.ids) - 1)
+            self.neighbours[row] = -1
+            self.scores[row] = -1.0
+            if k > 0:
+                top = np.argpartition(-similarity, k - 1)[:k]
+                top = top[np.argsort(-similarity[top])]
+                self.neighbours[row, :k] = top
+                self.scores[row, :k] = similarity[top]
+
+            # Refresh existing entries for this course in other lists
+            present = self.neighbours == row
+            present[row] = False
+            present_rows, present_columns = np.nonzero(present)
+            self.scores[present_rows, present_columns] = similarity[present_rows]
+
+            # Insert it wherever it beats the weakest neighbour
+            weakest = self.scores.argmin(axis=1)
+            weakest_scores = self.scores[np.arange(len(self.ids)), weakest]
+            candidates = (similarity > weakest_scores) & (similarity > 0) & ~present.any(axis=1)
+            candidates[row] = False
+            rows = np.nonzero(candidates)[0]
+            self.neighbours[rows, weakest[rows]] = row
+            self.scores[rows, weakest[rows]] = similarity[rows]
+
+            touched = np.union1d(present_rows, rows)
+            order = np.argsort(-self.scores[touched], axis=1)
+            self.neighbours[touched] = np.take_along_axis(self.neighbours[touched], order, axis=1)
+            self.scores[touched] = np.take_along_axis(self.scores[touched], order, axis=1)
+
+            self.updates_since_build += 1
+
+    def related(self, course_id: str, limit: int = RELATED_TOP_K) -> List[dict]:
+        if not self.built:
+            self.start_build()
+            return []
+        with self._lock:
+            row = self.index.get(course_id)
+            if row is None:
+                return []
+            related = []
+            for neighbour, score in zip(self.neighbours[row], self.scores[row]):
+                if neighbour < 0 or score <= 0 or len(related) >= limit:
+                    break
+                related.append({**self.cards[neighbour], "score": round(float(score), 4)})
+            return related
@@ -1,15 +1,30 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from pymongo import MongoClient
-from typing import Optional, List
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Annotated, FrozenSet, NamedTuple, Optional, List, Literal, Union
 import os
 from datetime import datetime, timedelta
 import jwt
-import bcrypt
 import uuid
 from enum import Enum
+import asyncio
+from analytics import MAX_ANALYTICS_DAYS, ViewTracker
+from events import EventBroker, event_stream
+from outline import (
+    OUTLINE_MAX_OPERATIONS, OutlineError, apply_outline_operations, next_version, version_now, version_timestamp
+)
+from passwords import hash_password, verify_password
+from profiling import (
+    SLOW_OP_MS, ProfilingMiddleware, SlowCommandListener, SlowRequestMiddleware, configure_slow_log
+)
+from provisioning import SUPPORTED_FORMATS, detect_format, iter_records, ndjson_report, provision_users
+from recommendations import RelatedCoursesModel
+from singleflight import SingleFlight
+from snapshots import POINTER_CACHE_CONTROL, SNAPSHOT_CACHE_CONTROL, freeze_course
+from storage import DuplicateError, create_storage
 
 app = FastAPI()
 
@@ -22,18 +37,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/elearning_db')
-client = MongoClient(MONGO_URL)
-db = client.elearning_db
+# Storage (MongoDB by default, SQLite or MariaDB via STORAGE_BACKEND)
+event_listeners = [SlowCommandListener()] if SLOW_OP_MS > 0 else []
+store = create_storage(event_listeners=event_listeners)
 
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-this')
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
 
+# Related courses, built from published snapshots in the background at startup
+related_courses = RelatedCoursesModel(loader=store.list_published_snapshots)
+
+# Live dashboard updates, one topic per instructor
+instructor_events = EventBroker()
+
+# Hot course reads: concurrent requests share one fetch and one serialization
+course_reads = SingleFlight()
+catalog_reads = SingleFlight()
+
+# View analytics, merged into storage every VIEW_FLUSH_SECONDS
+view_tracker = ViewTracker(store)
+view_flush_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+def setup_storage():
+    store.setup()
+
+@app.on_event("startup")
+def start_related_courses():
+    related_courses.start_build()
+
+@app.on_event("startup")
+async def start_view_tracker():
+    # Held so the loop task is not garbage collected while it sleeps
+    global view_flush_task
+    view_flush_task = asyncio.create_task(view_tracker.run())
+
+@app.on_event("shutdown")
+def flush_view_tracker():
+    if view_flush_task is not None:
+        view_flush_task.cancel()
+    view_tracker.flush()
+
 # Security
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Enums
 class UserRole(str, Enum):
@@ -94,6 +143,7 @@ class Course(BaseModel):
     thumbnail: Optional[str] = None
     price: Optional[float] = None
     is_published: bool = False
+    published_version: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
@@ -114,13 +164,47 @@ class ChapterCreate(BaseModel):
     chapter_type: ChapterType = ChapterType.FREE
     price: Optional[float] = None
 
-# Helper functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# Outline operations for PATCH /api/courses/{course_id}; positions are 0-based
+class MoveOperation(BaseModel):
+    op: Literal["move"]
+    chapter_id: str
+    section_id: str
+    position: Optional[int] = Field(None, ge=0)
+
+class ReorderOperation(BaseModel):
+    op: Literal["reorder"]
+    section_id: Optional[str] = None
+    chapter_id: Optional[str] = None
+    position: int = Field(ge=0)
+
+class RenameOperation(BaseModel):
+    op: Literal["rename"]
+    section_id: Optional[str] = None
+    chapter_id: Optional[str] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+class DeleteOperation(BaseModel):
+    op: Literal["delete"]
+    section_id: Optional[str] = None
+    chapter_id: Optional[str] = None
 
+class RepriceOperation(BaseModel):
+    op: Literal["reprice"]
+    chapter_id: str
+    chapter_type: ChapterType
+    price: Optional[float] = None
+
+OutlineOperation = Annotated[
+    Union[MoveOperation, ReorderOperation, RenameOperation, DeleteOperation, RepriceOperation],
+    Field(discriminator="op")
+]
+
+class OutlinePatch(BaseModel):
+    updated_at: datetime
+    operations: List[OutlineOperation] = Field(min_length=1, max_length=OUTLINE_MAX_OPERATIONS)
+
+# Helper functions
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
@@ -129,13 +213,27 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return user_from_token(credentials.credentials)
+
+def get_stream_user(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    # EventSource cannot send headers, so streams also accept ?token=
+    if credentials is not None:
+        return user_from_token(credentials.credentials)
+    if token:
+        return user_from_token(token)
+    raise HTTPException(status_code=401, detail="Not authenticated")
+
+def user_from_token(token: str) -> User:
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
         
-        user = db.users.find_one({"email": email})
+        user = store.get_user_by_email(email)
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         
@@ -151,6 +249,52 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
 
+class CachedCourse(NamedTuple):
+    instructor_id: str
+    is_published: bool
+    published_version: Optional[int]
+    chapter_ids: FrozenSet[str]
+    body: bytes
+
+def cached_course(course: dict) -> CachedCourse:
+    course = Course(**course)
+    return CachedCourse(
+        instructor_id=course.instructor_id,
+        is_published=course.is_published,
+        published_version=course.published_version,
+        chapter_ids=frozenset(chapter.id for section in course.sections for chapter in section.chapters),
+        body=course.model_dump_json().encode("utf-8")
+    )
+
+def load_course_response(course_id: str) -> Optional[CachedCourse]:
+    course = store.get_course(course_id)
+    return cached_course(course) if course else None
+
+def load_snapshot_response(course_id: str, version: int) -> Optional[CachedCourse]:
+    snapshot = store.get_course_version(course_id, version)
+    return cached_course(snapshot["course"]) if snapshot else None
+
+async def load_student_course(course_id: str, live: Optional[CachedCourse]) -> Optional[CachedCourse]:
+    """The course as students see it: its published snapshot, never the draft"""
+    if not live or not live.is_published:
+        return None
+    if live.published_version is None:
+        # Published before snapshots existed
+        return live
+    version = live.published_version
+    return await course_reads.get(f"{course_id}/v{version}", lambda: load_snapshot_response(course_id, version))
+
+course_list_adapter = TypeAdapter(List[Course])
+
+def load_catalog_response() -> bytes:
+    courses = [Course(**course) for course in store.list_published_snapshots()]
+    return course_list_adapter.dump_json(courses)
+
+def invalidate_course_reads(course: dict):
+    course_reads.invalidate(course["id"])
+    if course.get("is_published"):
+        catalog_reads.invalidate("published")
+
 def require_role(allowed_roles: List[UserRole]):
     def role_checker(current_user: User = Depends(get_current_user)):
         if current_user.role not in allowed_roles:
@@ -158,14 +302,28 @@ def require_role(allowed_roles: List[UserRole]):
         return current_user
     return role_checker
 
+def is_admin_token(token: str) -> bool:
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.PyJWTError:
+        return False
+    user = store.get_user_by_email(payload.get("sub"))
+    return user is not None and user["role"] == UserRole.ADMIN
+
+# Diagnostics: opt-in request profiling and slow operation log
+app.add_middleware(ProfilingMiddleware, authorize=is_admin_token)
+if SLOW_OP_MS > 0:
+    configure_slow_log()
+    app.add_middleware(SlowRequestMiddleware)
+
 # Auth Routes
 @app.post("/api/auth/register")
 async def register(user_data: UserCreate):
     # Check if user already exists
-    if db.users.find_one({"email": user_data.email}):
+    if store.get_user_by_email(user_data.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    if db.users.find_one({"username": user_data.username}):
+    if store.get_user_by_username(user_data.username):
         raise HTTPException(status_code=400, detail="Username already taken")
     
     # Create user
@@ -183,7 +341,11 @@ async def register(user_data: UserCreate):
         "is_active": True
     }
     
-    db.users.insert_one(user_doc)
+    try:
+        store.insert_user(user_doc)
+    except DuplicateError:
+        # Lost a race with another registration or a bulk upload
+        raise HTTPException(status_code=400, detail="Email or username already registered")
     
     # Create access token
     access_token = create_access_token(data={"sub": user_data.email})
@@ -196,7 +358,7 @@ async def register(user_data: UserCreate):
 
 @app.post("/api/auth/login")
 async def login(login_data: UserLogin):
-    user = db.users.find_one({"email": login_data.email})
+    user = store.get_user_by_email(login_data.email)
     if not user or not verify_password(login_data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     
@@ -234,17 +396,17 @@ async def create_course(
         "price": course_data.price,
         "is_published": False,
         "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
+        "updated_at": version_now()
     }
     
-    db.courses.insert_one(course_doc)
+    store.insert_course(course_doc)
     return Course(**course_doc)
 
 @app.get("/api/courses/my-courses")
 async def get_my_courses(
     current_user: User = Depends(require_role([UserRole.INSTRUCTOR]))
 ):
-    courses = list(db.courses.find({"instructor_id": current_user.id}))
+    courses = store.list_instructor_courses(current_user.id)
     return [Course(**course) for course in courses]
 
 @app.get("/api/courses/{course_id}")
@@ -252,15 +414,32 @@ async def get_course(
     course_id: str,
     current_user: User = Depends(get_current_user)
 ):
-    course = db.courses.find_one({"id": course_id})
-    if not course:
+    # Check permissions; only the owner sees the live draft. It is read
+    # uncached: the editor's next save is checked against its updated_at,
+    # and other workers' writes never invalidate this worker's cache.
+    if current_user.role == UserRole.INSTRUCTOR:
+        draft = await run_in_threadpool(load_course_response, course_id)
+        if not draft:
+            raise HTTPException(status_code=404, detail="Course not found")
+        if draft.instructor_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized to view this course")
+        return Response(content=draft.body, media_type="application/json")
+    
+    cached = await course_reads.get(course_id, lambda: load_course_response(course_id))
+    if not cached:
+        raise HTTPException(status_code=404, detail="Course not found")
+    
+    published = await load_student_course(course_id, cached)
+    if not published:
         raise HTTPException(status_code=404, detail="Course not found")
     
-    # Check permissions
-    if current_user.role == UserRole.INSTRUCTOR and course["instructor_id"] != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to view this course")
+    if current_user.role == UserRole.STUDENT:
+        view_tracker.record(course_id, current_user.id)
     
-    return Course(**course)
+    headers = {}
+    if published.published_version is not None:
+        headers["Content-Location"] = f"/api/courses/{course_id}/v/{published.published_version}"
+    return Response(content=published.body, media_type="application/json", headers=headers)
 
 @app.put("/api/courses/{course_id}")
 async def update_course(
@@ -268,31 +447,88 @@ async def update_course(
     course_data: CourseCreate,
     current_user: User = Depends(require_role([UserRole.INSTRUCTOR]))
 ):
-    course = db.courses.find_one({"id": course_id, "instructor_id": current_user.id})
+    course = store.get_course(course_id, instructor_id=current_user.id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     
-    db.courses.update_one(
-        {"id": course_id},
-        {"$set": {
-            "title": course_data.title,
-            "description": course_data.description,
-            "thumbnail": course_data.thumbnail,
-            "price": course_data.price,
-            "updated_at": datetime.utcnow()
-        }}
-    )
+    store.update_course(course_id, {
+        "title": course_data.title,
+        "description": course_data.description,
+        "thumbnail": course_data.thumbnail,
+        "price": course_data.price,
+        "updated_at": next_version(course["updated_at"])
+    })
+    
+    invalidate_course_reads(course)
+    instructor_events.publish(current_user.id, "course_updated", {
+        "course_id": course_id,
+        "title": course_data.title
+    })
     
-    updated_course = db.courses.find_one({"id": course_id})
+    updated_course = store.get_course(course_id)
     return Course(**updated_course)
 
+@app.patch("/api/courses/{course_id}")
+async def patch_course_outline(
+    course_id: str,
+    patch: OutlinePatch,
+    current_user: User = Depends(require_role([UserRole.INSTRUCTOR]))
+):
+    course = store.get_course(course_id, instructor_id=current_user.id)
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    
+    # updated_at is the version: the edit applies only to the outline the client saw
+    expected_updated_at = version_timestamp(patch.updated_at)
+    if course["updated_at"] != expected_updated_at:
+        raise HTTPException(status_code=409, detail="Course was modified, reload it and retry")
+    
+    try:
+        sections, changes = apply_outline_operations(
+            course.get("sections", []),
+            [operation.model_dump(mode="json") for operation in patch.operations]
+        )
+    except OutlineError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    updated_at = store.update_outline(
+        course_id, sections, changes, expected_updated_at, next_version(expected_updated_at)
+    )
+    if updated_at is None:
+        raise HTTPException(status_code=409, detail="Course was modified, reload it and retry")
+    
+    invalidate_course_reads(course)
+    instructor_events.publish(current_user.id, "outline_updated", {
+        "course_id": course_id,
+        "updated_at": updated_at.isoformat()
+    })
+    
+    # Only what changed, so the editor can patch its local copy
+    return {
+        "updated_at": updated_at,
+        "sections": [
+            {"id": section["id"], "title": section["title"], "description": section.get("description"),
+             "order": section["order"]}
+            for section in sections
+            if section["id"] in changes["sections"]
+        ],
+        "chapters": [
+            {"section_id": section["id"], **Chapter(**chapter).model_dump()}
+            for section in sections
+            for chapter in section["chapters"]
+            if chapter["id"] in changes["chapters"]
+        ],
+        "deleted_sections": sorted(changes["deleted_sections"]),
+        "deleted_chapters": sorted(changes["deleted_chapters"]),
+    }
+
 @app.post("/api/courses/{course_id}/sections")
 async def create_section(
     course_id: str,
     section_data: SectionCreate,
     current_user: User = Depends(require_role([UserRole.INSTRUCTOR]))
 ):
-    course = db.courses.find_one({"id": course_id, "instructor_id": current_user.id})
+    course = store.get_course(course_id, instructor_id=current_user.id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     
@@ -306,10 +542,13 @@ async def create_section(
         "created_at": datetime.utcnow()
     }
     
-    db.courses.update_one(
-        {"id": course_id},
-        {"$push": {"sections": section}, "$set": {"updated_at": datetime.utcnow()}}
-    )
+    store.add_section(course_id, section, next_version(course["updated_at"]))
+    invalidate_course_reads(course)
+    instructor_events.publish(current_user.id, "section_added", {
+        "course_id": course_id,
+        "section_id": section_id,
+        "title": section_data.title
+    })
     
     return Section(**section)
 
@@ -320,7 +559,7 @@ async def create_chapter(
     chapter_data: ChapterCreate,
     current_user: User = Depends(require_role([UserRole.INSTRUCTOR]))
 ):
-    course = db.courses.find_one({"id": course_id, "instructor_id": current_user.id})
+    course = store.get_course(course_id, instructor_id=current_user.id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     
@@ -346,13 +585,14 @@ async def create_chapter(
         "created_at": datetime.utcnow()
     }
     
-    db.courses.update_one(
-        {"id": course_id, f"sections.{section_index}.id": section_id},
-        {
-            "$push": {f"sections.{section_index}.chapters": chapter},
-            "$set": {"updated_at": datetime.utcnow()}
-        }
-    )
+    store.add_chapter(course_id, section_id, chapter, next_version(course["updated_at"]))
+    invalidate_course_reads(course)
+    instructor_events.publish(current_user.id, "chapter_added", {
+        "course_id": course_id,
+        "section_id": section_id,
+        "chapter_id": chapter_id,
+        "title": chapter_data.title
+    })
     
     return Chapter(**chapter)
 
@@ -361,22 +601,129 @@ async def publish_course(
     course_id: str,
     current_user: User = Depends(require_role([UserRole.INSTRUCTOR]))
 ):
-    course = db.courses.find_one({"id": course_id, "instructor_id": current_user.id})
+    course = store.get_course(course_id, instructor_id=current_user.id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     
-    db.courses.update_one(
-        {"id": course_id},
-        {"$set": {"is_published": True, "updated_at": datetime.utcnow()}}
+    # Freeze the current draft as an immutable version for students
+    tree = Course(**course).model_dump(mode="json")
+    try:
+        snapshot = freeze_course(store, tree)
+    except DuplicateError:
+        raise HTTPException(status_code=409, detail="Course is already being published")
+    
+    store.update_course(course_id, {
+        "is_published": True,
+        "published_version": snapshot["version"],
+        "updated_at": next_version(course["updated_at"])
+    })
+    course_reads.invalidate(course_id)
+    catalog_reads.invalidate("published")
+    # Tens of milliseconds on a large catalog; the model has its own lock
+    await run_in_threadpool(related_courses.upsert, tree)
+    instructor_events.publish(current_user.id, "course_published", {
+        "course_id": course_id,
+        "version": snapshot["version"]
+    })
+    
+    return {
+        "message": "Course published successfully",
+        "version": snapshot["version"],
+        "content_hash": snapshot["content_hash"]
+    }
+
+# Instructor dashboard live updates
+@app.get("/api/instructor/events")
+async def stream_instructor_events(current_user: User = Depends(get_stream_user)):
+    if current_user.role != UserRole.INSTRUCTOR:
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    
+    return StreamingResponse(
+        event_stream(instructor_events, current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
+
+# Admin routes
+@app.post("/api/admin/users/bulk")
+def bulk_create_users(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    current_user: User = Depends(require_role([UserRole.ADMIN]))
+):
+    upload_format = format or detect_format(file.filename, file.content_type)
+    if upload_format not in SUPPORTED_FORMATS:
+        raise HTTPException(status_code=400, detail="Upload must be CSV or NDJSON")
     
-    return {"message": "Course published successfully"}
+    # One line per row, in row order, then the counters for the whole upload
+    records = iter_records(file.file, upload_format)
+    results = provision_users(store, records, UserCreate, hash_password)
+    return StreamingResponse(ndjson_report(results), media_type="application/x-ndjson")
+
+@app.get("/api/admin/read-cache")
+async def get_read_cache_stats(
+    current_user: User = Depends(require_role([UserRole.ADMIN]))
+):
+    return {"courses": course_reads.stats(), "catalog": catalog_reads.stats()}
 
 # Public course routes for students
 @app.get("/api/courses")
 async def get_published_courses():
-    courses = list(db.courses.find({"is_published": True}))
-    return [Course(**course) for course in courses]
+    body = await catalog_reads.get("published", load_catalog_response)
+    return Response(content=body, media_type="application/json")
+
+@app.get("/api/courses/{course_id}/v/latest")
+async def get_course_current_version(course_id: str):
+    version = store.get_published_version(course_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Course not found")
+    
+    return JSONResponse(
+        content={"version": version, "url": f"/api/courses/{course_id}/v/{version}"},
+        headers={"Cache-Control": POINTER_CACHE_CONTROL}
+    )
+
+@app.get("/api/courses/{course_id}/v/{version}")
+async def get_course_version(course_id: str, version: int):
+    snapshot = store.get_course_version(course_id, version)
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Course version not found")
+    
+    return JSONResponse(
+        content=snapshot["course"],
+        headers={"Cache-Control": SNAPSHOT_CACHE_CONTROL, "ETag": f'"{snapshot["content_hash"]}"'}
+    )
+
+@app.post("/api/courses/{course_id}/chapters/{chapter_id}/views", status_code=204)
+async def record_chapter_view(
+    course_id: str,
+    chapter_id: str,
+    current_user: User = Depends(require_role([UserRole.STUDENT]))
+):
+    cached = await course_reads.get(course_id, lambda: load_course_response(course_id))
+    published = await load_student_course(course_id, cached)
+    if not published or chapter_id not in published.chapter_ids:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    
+    view_tracker.record(course_id, current_user.id, chapter_id)
+    return Response(status_code=204)
+
+@app.get("/api/courses/{course_id}/analytics")
+async def get_course_analytics(
+    course_id: str,
+    days: int = 7,
+    current_user: User = Depends(require_role([UserRole.INSTRUCTOR]))
+):
+    course = store.get_course(course_id, instructor_id=current_user.id)
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found or not authorized")
+    
+    days = max(1, min(days, MAX_ANALYTICS_DAYS))
+    return view_tracker.summary(course, days)
+
+@app.get("/api/courses/{course_id}/related")
+async def get_related_courses(course_id: str, limit: int = 5):
+    return related_courses.related(course_id, limit)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from starlette.concurrency import run_in_threadpool
+
+# How long a loaded value is served to later requests without reloading
+SINGLE_FLIGHT_TTL_MS = float(os.environ.get('SINGLE_FLIGHT_TTL_MS', '500'))
+SINGLE_FLIGHT_MAX_ENTRIES = int(os.environ.get('SINGLE_FLIGHT_MAX_ENTRIES', '10000'))
+
+class SingleFlight:
+    """Coalesces concurrent reads of the same key into one load.
+
+    The first caller for a key starts ``load`` in the thread pool; callers
+    arriving while it runs await the same task, and callers arriving
+    within ``ttl_ms`` afterwards get the stored value. All bookkeeping
+    happens on the event loop, so no locking is needed.
+    """
+
+    def __init__(self, ttl_ms: float = SINGLE_FLIGHT_TTL_MS, max_entries: int = SINGLE_FLIGHT_MAX_ENTRIES):
+        self.ttl = ttl_ms / 1000.0
+        self.max_entries = max_entries
+        self._values = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.coalesced = 0
+        self.loads = 0
+
+    async def get(self, key: Hashable, load: Callable[[], Any]):
+        entry = self._values.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.loads += 1
+            task = asyncio.ensure_future(self._load(key, load))
+            self._inflight[key] = task
+        # A caller that disconnects must not cancel the load for the others
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, load: Callable[[], Any]):
+        task = asyncio.current_task()
+        try:
+            value = await run_in_threadpool(load)
+        finally:
+            # Invalidated while loading: hand the value to current waiters only
+            is_current = self._inflight.get(key) is task
+            if is_current:
+                del self._inflight[key]
+        if is_current:
+            self._store(key, value)
+        return value
+
+    def _store(self, key: Hashable, value):
+        self._values[key] = (time.monotonic() + self.ttl, value)
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_entries:
+            self._values.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._values.pop(key, None)
+        # Later callers start a fresh load instead of joining a stale one
+        self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        requests = self.hits + self.coalesced + self.loads
+        return {
+            "requests": requests,
+            "loads": self.loads,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "entries": len(self._values),
+            "hit_ratio": round((self.hits + self.coalesced) / requests, 4) if requests else 0.0,
+        }
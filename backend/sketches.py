@@ -0,0 +1,177 @@
+import hashlib
+import math
+import struct
+import zlib
+from typing import Optional
+
+import numpy as np
+
+# Sketch sizes; changing them makes stored blobs unmergeable with new ones
+COURSE_HLL_PRECISION = 12   # 4096 registers, 4 KiB, ~1.6% standard error
+CHAPTER_HLL_PRECISION = 10  # 1024 registers, 1 KiB, ~3.3% standard error
+CMS_WIDTH = 1024            # overestimate <= e/1024 (~0.27%) of all views ...
+CMS_DEPTH = 4               # ... with probability >= 1 - e^-4 (~98%)
+
+_MAGIC = b"VS1"
+
+def _hash64(item: str) -> int:
+    return int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big")
+
+def _sigma(x: float) -> float:
+    if x == 1:
+        return math.inf
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+def _tau(x: float) -> float:
+    if x == 0 or x == 1:
+        return 0.0
+    y = 1.0
+    z = 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+class HyperLogLog:
+    """Distinct counter with 2^p one-byte registers.
+
+    The relative standard error is 1.04 / sqrt(2^p); two sketches merge
+    by taking the register-wise maximum, which is exactly the sketch of
+    the union of their inputs.
+    """
+
+    def __init__(self, precision: int, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.size, dtype=np.uint8)
+
+    @property
+    def standard_error(self) -> float:
+        return 1.04 / math.sqrt(self.size)
+
+    def add(self, item: str):
+        value = _hash64(item)
+        index = value >> (64 - self.precision)
+        remainder = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        # Ertl's improved estimator ("New cardinality estimation algorithms
+        # for HyperLogLog sketches", 2017): unbiased from empty up to 2^64
+        # without the switch to linear counting, whose error peaks near 2.5m
+        m = self.size
+        q = 64 - self.precision
+        histogram = np.bincount(self.registers, minlength=q + 2)
+        z = m * _tau(1 - histogram[q + 1] / m)
+        for rank in range(q, 0, -1):
+            z = 0.5 * (z + histogram[rank])
+        z += m * _sigma(histogram[0] / m)
+        if math.isinf(z):
+            return 0
+        return int(round(m * m / (2 * math.log(2) * z)))
+
+class CountMinSketch:
+    """Frequency counter whose estimates never undercount.
+
+    With width w and depth d, an estimate exceeds the true count by more
+    than (e / w) * total with probability at most e^-d.
+    """
+
+    def __init__(self, width: int = CMS_WIDTH, depth: int = CMS_DEPTH, table: Optional[np.ndarray] = None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.uint32)
+
+    @property
+    def epsilon(self) -> float:
+        return math.e / self.width
+
+    @property
+    def delta(self) -> float:
+        return math.exp(-self.depth)
+
+    def _columns(self, item: str) -> np.ndarray:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        return np.array([(first + row * second) % self.width for row in range(self.depth)])
+
+    def add(self, item: str, count: int = 1):
+        self.table[np.arange(self.depth), self._columns(item)] += count
+
+    def estimate(self, item: str) -> int:
+        return int(self.table[np.arange(self.depth), self._columns(item)].min())
+
+    def merge(self, other: "CountMinSketch"):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge count-min sketches of different shape")
+        self.table += other.table
+
+class ViewSketch:
+    """Views and unique learners for one course or chapter on one day.
+
+    With ``with_chapters`` it also carries a count-min sketch of views per
+    chapter; analytics counts those exactly in per-chapter sketches
+    instead. The size depends only on the configured precision and width,
+    never on traffic.
+    """
+
+    def __init__(self, precision: int, with_chapters: bool = False):
+        self.views = 0
+        self.learners = HyperLogLog(precision)
+        self.chapters = CountMinSketch() if with_chapters else None
+
+    def record(self, student_id: str, chapter_id: Optional[str] = None):
+        self.views += 1
+        self.learners.add(student_id)
+        if chapter_id is not None and self.chapters is not None:
+            self.chapters.add(chapter_id)
+
+    def merge(self, other: "ViewSketch"):
+        self.views += other.views
+        self.learners.merge(other.learners)
+        if other.chapters is not None:
+            if self.chapters is None:
+                self.chapters = CountMinSketch(other.chapters.width, other.chapters.depth)
+            self.chapters.merge(other.chapters)
+
+    def to_bytes(self) -> bytes:
+        width, depth = (self.chapters.width, self.chapters.depth) if self.chapters is not None else (0, 0)
+        header = _MAGIC + struct.pack(">QBIB", self.views, self.learners.precision, width, depth)
+        body = self.learners.registers.tobytes()
+        if self.chapters is not None:
+            body += self.chapters.table.astype(">u4").tobytes()
+        return header + zlib.compress(body)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "ViewSketch":
+        if blob[:3] != _MAGIC:
+            raise ValueError("Not a view sketch")
+        views, precision, width, depth = struct.unpack_from(">QBIB", blob, 3)
+        body = zlib.decompress(blob[3 + struct.calcsize(">QBIB"):])
+        sketch = cls(precision)
+        sketch.views = views
+        size = 1 << precision
+        sketch.learners.registers = np.frombuffer(body[:size], dtype=np.uint8).copy()
+        if width:
+            table = np.frombuffer(body[size:], dtype=">u4").reshape(depth, width).astype(np.uint32)
+            sketch.chapters = CountMinSketch(width, depth, table)
+        return sketch
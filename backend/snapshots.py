@@ -0,0 +1,40 @@
+import hashlib
+import json
+from datetime import datetime
+
+# Snapshots never change once written, so any cache may keep them forever
+SNAPSHOT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# The pointer to the current version moves on every publish
+POINTER_CACHE_CONTROL = "public, max-age=30"
+
+# Fields that change without the course content changing
+_VOLATILE_FIELDS = ("updated_at", "is_published", "published_version")
+
+def content_hash(tree: dict) -> str:
+    stable = {key: value for key, value in tree.items() if key not in _VOLATILE_FIELDS}
+    encoded = json.dumps(stable, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def freeze_course(storage, tree: dict) -> dict:
+    """Store ``tree`` as the next immutable version of its course.
+
+    ``tree`` is the JSON-ready course as students will receive it. When
+    its content hash matches the latest snapshot, that snapshot is reused
+    instead of writing a new version. A concurrent publish of the same
+    course surfaces as a ``DuplicateError`` from the storage layer.
+    """
+    digest = content_hash(tree)
+    latest = storage.latest_course_version(tree["id"])
+    if latest and latest["content_hash"] == digest:
+        return latest
+
+    version = latest["version"] + 1 if latest else 1
+    snapshot = {
+        "course_id": tree["id"],
+        "version": version,
+        "content_hash": digest,
+        "course": {**tree, "is_published": True, "published_version": version},
+        "created_at": datetime.utcnow()
+    }
+    storage.insert_course_version(snapshot)
+    return {"version": version, "content_hash": digest}
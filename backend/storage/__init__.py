@@ -0,0 +1,32 @@
+import os
+
+from .base import DuplicateError, Storage
+
+# Storage configuration: "mongo" (default), "sqlite" or "mariadb"
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'elearning.db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '8'))
+
+def create_storage(backend: str = STORAGE_BACKEND, event_listeners=None) -> Storage:
+    if backend == "mongo":
+        from .mongo import MongoStorage
+        return MongoStorage(
+            os.environ.get('MONGO_URL', 'mongodb://localhost:27017/elearning_db'),
+            event_listeners=event_listeners
+        )
+    if backend == "sqlite":
+        from .sql import SQLiteDialect, SQLStorage
+        return SQLStorage(SQLiteDialect(SQLITE_PATH, pool_size=DB_POOL_SIZE))
+    if backend == "mariadb":
+        from .sql import MariaDBDialect, SQLStorage
+        return SQLStorage(MariaDBDialect(
+            host=os.environ.get('DB_HOST', 'localhost'),
+            port=int(os.environ.get('DB_PORT', '3306')),
+            user=os.environ.get('DB_USER', 'root'),
+            password=os.environ.get('DB_PASSWORD', ''),
+            database=os.environ.get('DB_NAME', 'elearning_db'),
+            pool_size=DB_POOL_SIZE,
+        ))
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+__all__ = ["DuplicateError", "Storage", "create_storage"]
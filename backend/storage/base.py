@@ -0,0 +1,119 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+class DuplicateError(Exception):
+    """A write collided with a unique key"""
+
+class Storage(ABC):
+    """Persistence used by the API routes.
+
+    Documents go in and come out in the shape the routes already use: a
+    course is a dict with its ``sections`` list, each holding its
+    ``chapters``, ordered by ``order``. Implementations never return
+    backend-specific fields such as Mongo's ``_id``.
+    """
+
+    def setup(self):
+        """Create indexes or tables the backend needs; safe to call repeatedly"""
+
+    def close(self):
+        """Release pooled connections"""
+
+    # Users
+    @abstractmethod
+    def get_user_by_email(self, email: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    def get_user_by_username(self, username: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    def insert_user(self, user: dict):
+        """Raises ``DuplicateError`` if the email or username is taken"""
+
+    @abstractmethod
+    def existing_users(self, emails: List[str], usernames: List[str]) -> Tuple[Set[str], Set[str]]:
+        """Return which of the emails and usernames are taken, in one query"""
+
+    @abstractmethod
+    def insert_users(self, users: List[dict]) -> Dict[int, str]:
+        """Insert a batch without stopping at the first failure.
+
+        Returns the error message for each index that could not be inserted.
+        """
+
+    # Courses
+    @abstractmethod
+    def insert_course(self, course: dict): ...
+
+    @abstractmethod
+    def get_course(self, course_id: str, instructor_id: Optional[str] = None) -> Optional[dict]: ...
+
+    @abstractmethod
+    def list_instructor_courses(self, instructor_id: str) -> List[dict]: ...
+
+    @abstractmethod
+    def list_published_courses(self) -> Iterable[dict]: ...
+
+    @abstractmethod
+    def update_course(self, course_id: str, fields: dict):
+        """Set top-level course fields such as ``title`` or ``updated_at``"""
+
+    @abstractmethod
+    def add_section(self, course_id: str, section: dict, updated_at): ...
+
+    @abstractmethod
+    def add_chapter(self, course_id: str, section_id: str, chapter: dict, updated_at): ...
+
+    @abstractmethod
+    def update_outline(self, course_id: str, sections: List[dict], changes: dict,
+                       expected_updated_at: datetime, updated_at: datetime) -> Optional[datetime]:
+        """Atomically store an edited outline if ``updated_at`` is unchanged.
+
+        ``sections`` is the full new outline; ``changes`` holds the ids of
+        the ``sections`` and ``chapters`` to rewrite and the
+        ``deleted_sections`` and ``deleted_chapters``. Returns the
+        ``updated_at`` as stored, or None, writing nothing, when the course
+        was modified since ``expected_updated_at``.
+        """
+
+    # Published snapshots
+    @abstractmethod
+    def get_published_version(self, course_id: str) -> Optional[int]:
+        """The version students are served, or None if the course is not published"""
+
+    @abstractmethod
+    def latest_course_version(self, course_id: str) -> Optional[dict]:
+        """Return ``version`` and ``content_hash`` of the newest snapshot"""
+
+    @abstractmethod
+    def insert_course_version(self, snapshot: dict):
+        """Store a snapshot; raises ``DuplicateError`` if the version exists"""
+
+    @abstractmethod
+    def get_course_version(self, course_id: str, version: int) -> Optional[dict]:
+        """Return ``course`` and ``content_hash`` of one snapshot"""
+
+    @abstractmethod
+    def list_published_snapshots(self) -> List[dict]:
+        """The current snapshot tree of every published course.
+
+        Courses published before snapshots existed have no
+        ``published_version`` and come back as their live document.
+        """
+
+    # View analytics sketches
+    @abstractmethod
+    def get_view_sketch(self, key: str) -> Optional[Tuple[bytes, int]]:
+        """Return the stored blob and its revision"""
+
+    @abstractmethod
+    def get_view_sketches(self, keys: List[str]) -> Dict[str, bytes]: ...
+
+    @abstractmethod
+    def put_view_sketch(self, key: str, course_id: str, day: str, blob: bytes, revision: Optional[int]) -> bool:
+        """Write ``blob`` if the stored revision still equals ``revision``.
+
+        ``revision`` is None when the key was absent. Returns False when
+        another writer got there first.
+        """
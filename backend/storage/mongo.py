@@ -0,0 +1,177 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import DESCENDING, MongoClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from .base import DuplicateError, Storage
+
+_NO_ID = {"_id": 0}
+
+class MongoStorage(Storage):
+    """Courses stored as single documents embedding their sections and chapters"""
+
+    def __init__(self, url: str, database: str = "elearning_db", event_listeners=None):
+        self.client = MongoClient(url, event_listeners=event_listeners or [])
+        self.db = self.client[database]
+
+    def setup(self):
+        self.db.users.create_index("email", unique=True)
+        self.db.users.create_index("username", unique=True)
+        self.db.course_versions.create_index([("course_id", 1), ("version", 1)], unique=True)
+        self.db.view_sketches.create_index("key", unique=True)
+
+    def close(self):
+        self.client.close()
+
+    # Users
+    def get_user_by_email(self, email: str) -> Optional[dict]:
+        return self.db.users.find_one({"email": email}, _NO_ID)
+
+    def get_user_by_username(self, username: str) -> Optional[dict]:
+        return self.db.users.find_one({"username": username}, _NO_ID)
+
+    def insert_user(self, user: dict):
+        try:
+            self.db.users.insert_one(dict(user))
+        except DuplicateKeyError as e:
+            raise DuplicateError(str(e))
+
+    def existing_users(self, emails: List[str], usernames: List[str]) -> Tuple[Set[str], Set[str]]:
+        existing_emails = set()
+        existing_usernames = set()
+        for user in self.db.users.find(
+            {"$or": [{"email": {"$in": emails}}, {"username": {"$in": usernames}}]},
+            {"_id": 0, "email": 1, "username": 1}
+        ):
+            existing_emails.add(user.get("email"))
+            existing_usernames.add(user.get("username"))
+        return existing_emails, existing_usernames
+
+    def insert_users(self, users: List[dict]) -> Dict[int, str]:
+        try:
+            self.db.users.insert_many([dict(user) for user in users], ordered=False)
+        except BulkWriteError as e:
+            return {error["index"]: error["errmsg"] for error in e.details.get("writeErrors", [])}
+        return {}
+
+    # Courses
+    def insert_course(self, course: dict):
+        self.db.courses.insert_one(dict(course))
+
+    def get_course(self, course_id: str, instructor_id: Optional[str] = None) -> Optional[dict]:
+        query = {"id": course_id}
+        if instructor_id is not None:
+            query["instructor_id"] = instructor_id
+        return self.db.courses.find_one(query, _NO_ID)
+
+    def list_instructor_courses(self, instructor_id: str) -> List[dict]:
+        return list(self.db.courses.find({"instructor_id": instructor_id}, _NO_ID))
+
+    def list_published_courses(self) -> Iterable[dict]:
+        return self.db.courses.find({"is_published": True}, _NO_ID)
+
+    def update_course(self, course_id: str, fields: dict):
+        self.db.courses.update_one({"id": course_id}, {"$set": fields})
+
+    def add_section(self, course_id: str, section: dict, updated_at):
+        self.db.courses.update_one(
+            {"id": course_id},
+            {"$push": {"sections": section}, "$set": {"updated_at": updated_at}}
+        )
+
+    def add_chapter(self, course_id: str, section_id: str, chapter: dict, updated_at):
+        self.db.courses.update_one(
+            {"id": course_id, "sections.id": section_id},
+            {"$push": {"sections.$.chapters": chapter}, "$set": {"updated_at": updated_at}}
+        )
+
+    def update_outline(self, course_id: str, sections: List[dict], changes: dict,
+                       expected_updated_at: datetime, updated_at: datetime) -> Optional[datetime]:
+        fields = {"updated_at": updated_at}
+        if changes["deleted_sections"]:
+            fields["sections"] = sections
+        else:
+            # Same number of sections, so array positions stay valid under the version guard
+            for index, section in enumerate(sections):
+                if section["id"] in changes["sections"]:
+                    fields[f"sections.{index}"] = section
+        result = self.db.courses.update_one(
+            {"id": course_id, "updated_at": expected_updated_at},
+            {"$set": fields}
+        )
+        if result.matched_count != 1:
+            return None
+        # BSON datetimes keep milliseconds, so this is the value read back
+        return updated_at.replace(microsecond=updated_at.microsecond // 1000 * 1000)
+
+    # Published snapshots
+    def get_published_version(self, course_id: str) -> Optional[int]:
+        course = self.db.courses.find_one(
+            {"id": course_id, "is_published": True},
+            {"_id": 0, "published_version": 1}
+        )
+        return course.get("published_version") if course else None
+
+    def latest_course_version(self, course_id: str) -> Optional[dict]:
+        return self.db.course_versions.find_one(
+            {"course_id": course_id},
+            {"_id": 0, "version": 1, "content_hash": 1},
+            sort=[("version", DESCENDING)]
+        )
+
+    def insert_course_version(self, snapshot: dict):
+        try:
+            self.db.course_versions.insert_one(dict(snapshot))
+        except DuplicateKeyError as e:
+            raise DuplicateError(str(e))
+
+    def get_course_version(self, course_id: str, version: int) -> Optional[dict]:
+        return self.db.course_versions.find_one(
+            {"course_id": course_id, "version": version},
+            {"_id": 0, "course": 1, "content_hash": 1}
+        )
+
+    def list_published_snapshots(self) -> List[dict]:
+        pointers = list(self.db.courses.find(
+            {"is_published": True, "published_version": {"$ne": None}},
+            {"_id": 0, "id": 1, "published_version": 1}
+        ))
+        trees = []
+        for start in range(0, len(pointers), 500):
+            chunk = pointers[start:start + 500]
+            trees.extend(
+                snapshot["course"]
+                for snapshot in self.db.course_versions.find(
+                    {"$or": [{"course_id": pointer["id"], "version": pointer["published_version"]} for pointer in chunk]},
+                    {"_id": 0, "course": 1}
+                )
+            )
+        trees.extend(self.db.courses.find({"is_published": True, "published_version": None}, _NO_ID))
+        return trees
+
+    # View analytics sketches
+    def get_view_sketch(self, key: str) -> Optional[Tuple[bytes, int]]:
+        sketch = self.db.view_sketches.find_one({"key": key}, {"_id": 0, "blob": 1, "revision": 1})
+        return (bytes(sketch["blob"]), sketch["revision"]) if sketch else None
+
+    def get_view_sketches(self, keys: List[str]) -> Dict[str, bytes]:
+        return {
+            sketch["key"]: bytes(sketch["blob"])
+            for sketch in self.db.view_sketches.find({"key": {"$in": keys}}, {"_id": 0, "key": 1, "blob": 1})
+        }
+
+    def put_view_sketch(self, key: str, course_id: str, day: str, blob: bytes, revision: Optional[int]) -> bool:
+        if revision is None:
+            try:
+                self.db.view_sketches.insert_one(
+                    {"key": key, "course_id": course_id, "day": day, "blob": blob, "revision": 1}
+                )
+            except DuplicateKeyError:
+                return False
+            return True
+        result = self.db.view_sketches.update_one(
+            {"key": key, "revision": revision},
+            {"$set": {"blob": blob, "revision": revision + 1}}
+        )
+        return result.matched_count == 1
@@ -0,0 +1,545 @@
+import json
+import queue
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .base import DuplicateError, Storage
+
+USER_COLUMNS = ("id", "username", "email", "password", "role", "full_name", "is_active", "created_at")
+COURSE_COLUMNS = (
+    "id", "title", "description", "instructor_id", "instructor_name", "thumbnail", "price",
+    "is_published", "published_version", "created_at", "updated_at",
+)
+SECTION_COLUMNS = ("id", "course_id", "title", "description", "order_index", "created_at")
+CHAPTER_COLUMNS = (
+    "id", "section_id", "course_id", "title", "description", "video_url", "chapter_type",
+    "price", "order_index", "created_at",
+)
+
+# Largest IN (...) list sent in one statement when loading many courses
+IN_CHUNK_SIZE = 500
+
+# Tables used by the API, written so SQLite and MariaDB both accept them.
+# Column types match database_schema.sql, so SQLite runs see the same
+# precision; on MariaDB these are no-ops once that file has been applied.
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id VARCHAR(36) PRIMARY KEY,
+        username VARCHAR(50) NOT NULL UNIQUE,
+        email VARCHAR(100) NOT NULL UNIQUE,
+        password VARCHAR(255) NOT NULL,
+        role VARCHAR(20) NOT NULL DEFAULT 'student',
+        full_name VARCHAR(100),
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at DATETIME(6) NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS courses (
+        id VARCHAR(36) PRIMARY KEY,
+        title VARCHAR(200) NOT NULL,
+        description TEXT NOT NULL,
+        instructor_id VARCHAR(36) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        instructor_name VARCHAR(100) NOT NULL,
+        thumbnail VARCHAR(500),
+        price DECIMAL(10,2),
+        is_published BOOLEAN DEFAULT FALSE,
+        published_version INT,
+        created_at DATETIME(6) NOT NULL,
+        updated_at DATETIME(3) NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS sections (
+        id VARCHAR(36) PRIMARY KEY,
+        course_id VARCHAR(36) NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+        title VARCHAR(200) NOT NULL,
+        description TEXT,
+        order_index INT DEFAULT 0,
+        created_at DATETIME(6) NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS chapters (
+        id VARCHAR(36) PRIMARY KEY,
+        section_id VARCHAR(36) NOT NULL REFERENCES sections(id) ON DELETE CASCADE,
+        course_id VARCHAR(36) NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+        title VARCHAR(200) NOT NULL,
+        description TEXT NOT NULL,
+        video_url VARCHAR(500),
+        chapter_type VARCHAR(10) DEFAULT 'free',
+        price DECIMAL(10,2),
+        order_index INT DEFAULT 0,
+        created_at DATETIME(6) NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS course_versions (
+        course_id VARCHAR(36) NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+        version INT NOT NULL,
+        content_hash CHAR(64) NOT NULL,
+        course LONGTEXT NOT NULL,
+        created_at DATETIME(6) NOT NULL,
+        PRIMARY KEY (course_id, version)
+    )""",
+    """CREATE TABLE IF NOT EXISTS view_sketches (
+        sketch_key VARCHAR(255) PRIMARY KEY,
+        course_id VARCHAR(36) NOT NULL,
+        day VARCHAR(10) NOT NULL,
+        sketch LONGBLOB NOT NULL,
+        revision INT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_courses_instructor ON courses(instructor_id)",
+    "CREATE INDEX IF NOT EXISTS idx_courses_published ON courses(is_published)",
+    "CREATE INDEX IF NOT EXISTS idx_sections_course_order ON sections(course_id, order_index)",
+    "CREATE INDEX IF NOT EXISTS idx_chapters_course_section_order ON chapters(course_id, section_id, order_index)",
+]
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+
+def _value(value):
+    """Plain value for a driver parameter (enums become their string)"""
+    return getattr(value, "value", value)
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _number(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+def _placeholders(count: int) -> str:
+    return ", ".join("?" * count)
+
+def _chunks(items: list, size: int = IN_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class SQLiteDialect:
+    """Pooled sqlite3 connections; each keeps its own prepared statement cache"""
+
+    integrity_errors = (sqlite3.IntegrityError,)
+
+    def __init__(self, path: str, pool_size: int = 8):
+        self.path = path
+        # Every connection to :memory: is a separate database
+        size = 1 if path == ":memory:" else pool_size
+        self._pool = queue.LifoQueue()
+        for _ in range(size):
+            self._pool.put(self._connect())
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        connection.execute("PRAGMA foreign_keys = ON")
+        if self.path != ":memory:":
+            connection.execute("PRAGMA journal_mode = WAL")
+        return connection
+
+    def acquire(self):
+        return self._pool.get()
+
+    def release(self, connection):
+        self._pool.put(connection)
+
+    def cursor(self, connection):
+        return connection.cursor()
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get().close()
+
+class MariaDBDialect:
+    """MariaDB Connector/Python pool using server-side prepared statements"""
+
+    def __init__(self, host: str, port: int, user: str, password: str, database: str,
+                 pool_size: int = 8, acquire_timeout: float = 10.0):
+        import mariadb
+
+        self.integrity_errors = (mariadb.IntegrityError,)
+        self._pool_error = mariadb.PoolError
+        self.acquire_timeout = acquire_timeout
+        self._pool = mariadb.ConnectionPool(
+            pool_name="elearning",
+            pool_size=pool_size,
+            host=host,
+            port=port,
+            user=user,
+            password=password,
+            database=database,
+            autocommit=False,
+        )
+
+    def acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            try:
+                return self._pool.get_connection()
+            except self._pool_error:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.005)
+
+    def release(self, connection):
+        # Closing a pooled connection hands it back to the pool
+        connection.close()
+
+    def cursor(self, connection):
+        return connection.cursor(prepared=True)
+
+    def close(self):
+        self._pool.close()
+
+class SQLStorage(Storage):
+    """Relational storage over the users/courses/sections/chapters tables.
+
+    Course trees are loaded with one query per table and reassembled in
+    Python; multi-row writes go through ``executemany`` inside a single
+    transaction.
+    """
+
+    def __init__(self, dialect):
+        self.dialect = dialect
+
+    @contextmanager
+    def _cursor(self):
+        connection = self.dialect.acquire()
+        try:
+            cursor = self.dialect.cursor(connection)
+            try:
+                yield cursor
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        finally:
+            self.dialect.release(connection)
+
+    def setup(self):
+        with self._cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+
+    def close(self):
+        self.dialect.close()
+
+    # Users
+    def _user(self, row) -> Optional[dict]:
+        if row is None:
+            return None
+        user = dict(zip(USER_COLUMNS, row))
+        user["is_active"] = bool(user["is_active"])
+        user["created_at"] = _datetime(user["created_at"])
+        return user
+
+    def _user_params(self, user: dict) -> tuple:
+        return tuple(_value(user.get(column)) for column in USER_COLUMNS)
+
+    def get_user_by_email(self, email: str) -> Optional[dict]:
+        with self._cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE email = ?", (email,))
+            return self._user(cursor.fetchone())
+
+    def get_user_by_username(self, username: str) -> Optional[dict]:
+        with self._cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE username = ?", (username,))
+            return self._user(cursor.fetchone())
+
+    def insert_user(self, user: dict):
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({_placeholders(len(USER_COLUMNS))})",
+                    self._user_params(user)
+                )
+        except self.dialect.integrity_errors as e:
+            raise DuplicateError(str(e))
+
+    def existing_users(self, emails: List[str], usernames: List[str]) -> Tuple[Set[str], Set[str]]:
+        existing_emails = set()
+        existing_usernames = set()
+        if not emails and not usernames:
+            return existing_emails, existing_usernames
+        with self._cursor() as cursor:
+            cursor.execute(
+                f"SELECT email, username FROM users "
+                f"WHERE email IN ({_placeholders(len(emails))}) OR username IN ({_placeholders(len(usernames))})",
+                (*emails, *usernames)
+            )
+            for email, username in cursor.fetchall():
+                existing_emails.add(email)
+                existing_usernames.add(username)
+        return existing_emails, existing_usernames
+
+    def insert_users(self, users: List[dict]) -> Dict[int, str]:
+        statement = f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({_placeholders(len(USER_COLUMNS))})"
+        params = [self._user_params(user) for user in users]
+        try:
+            with self._cursor() as cursor:
+                cursor.executemany(statement, params)
+            return {}
+        except self.dialect.integrity_errors:
+            pass
+
+        # The batch was rolled back; retry row by row to report each conflict
+        errors = {}
+        for index, row in enumerate(params):
+            try:
+                with self._cursor() as cursor:
+                    cursor.execute(statement, row)
+            except self.dialect.integrity_errors as e:
+                errors[index] = str(e)
+        return errors
+
+    # Courses
+    def _load_courses(self, cursor, rows) -> List[dict]:
+        courses = []
+        by_id = {}
+        for row in rows:
+            course = dict(zip(COURSE_COLUMNS, row))
+            course["price"] = _number(course["price"])
+            course["is_published"] = bool(course["is_published"])
+            course["created_at"] = _datetime(course["created_at"])
+            course["updated_at"] = _datetime(course["updated_at"])
+            course["sections"] = []
+            courses.append(course)
+            by_id[course["id"]] = course
+        if not courses:
+            return courses
+
+        sections_by_id = {}
+        for ids in _chunks(list(by_id)):
+            cursor.execute(
+                f"SELECT {', '.join(SECTION_COLUMNS)} FROM sections "
+                f"WHERE course_id IN ({_placeholders(len(ids))}) ORDER BY course_id, order_index",
+                tuple(ids)
+            )
+            for row in cursor.fetchall():
+                section = dict(zip(SECTION_COLUMNS, row))
+                course_id = section.pop("course_id")
+                section["order"] = section.pop("order_index")
+                section["created_at"] = _datetime(section["created_at"])
+                section["chapters"] = []
+                by_id[course_id]["sections"].append(section)
+                sections_by_id[section["id"]] = section
+
+            cursor.execute(
+                f"SELECT {', '.join(CHAPTER_COLUMNS)} FROM chapters "
+                f"WHERE course_id IN ({_placeholders(len(ids))}) ORDER BY section_id, order_index",
+                tuple(ids)
+            )
+            for row in cursor.fetchall():
+                chapter = dict(zip(CHAPTER_COLUMNS, row))
+                section_id = chapter.pop("section_id")
+                del chapter["course_id"]
+                chapter["order"] = chapter.pop("order_index")
+                chapter["price"] = _number(chapter["price"])
+                chapter["created_at"] = _datetime(chapter["created_at"])
+                sections_by_id[section_id]["chapters"].append(chapter)
+        return courses
+
+    def _select_courses(self, where: str, params: tuple) -> List[dict]:
+        with self._cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(COURSE_COLUMNS)} FROM courses WHERE {where}", params)
+            return self._load_courses(cursor, cursor.fetchall())
+
+    def insert_course(self, course: dict):
+        with self._cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO courses ({', '.join(COURSE_COLUMNS)}) VALUES ({_placeholders(len(COURSE_COLUMNS))})",
+                tuple(_value(course.get(column)) for column in COURSE_COLUMNS)
+            )
+            self._insert_outline(cursor, course["id"], course.get("sections", []))
+
+    def _insert_outline(self, cursor, course_id: str, sections: List[dict]):
+        if not sections:
+            return
+        cursor.executemany(
+            f"INSERT INTO sections ({', '.join(SECTION_COLUMNS)}) VALUES ({_placeholders(len(SECTION_COLUMNS))})",
+            [
+                (section["id"], course_id, section["title"], section.get("description"),
+                 section["order"], section["created_at"])
+                for section in sections
+            ]
+        )
+        chapters = [
+            (chapter["id"], section["id"], course_id, chapter["title"], chapter["description"],
+             chapter.get("video_url"), _value(chapter.get("chapter_type", "free")), chapter.get("price"),
+             chapter["order"], chapter["created_at"])
+            for section in sections
+            for chapter in section.get("chapters", [])
+        ]
+        if chapters:
+            cursor.executemany(
+                f"INSERT INTO chapters ({', '.join(CHAPTER_COLUMNS)}) VALUES ({_placeholders(len(CHAPTER_COLUMNS))})",
+                chapters
+            )
+
+    def get_course(self, course_id: str, instructor_id: Optional[str] = None) -> Optional[dict]:
+        if instructor_id is None:
+            courses = self._select_courses("id = ?", (course_id,))
+        else:
+            courses = self._select_courses("id = ? AND instructor_id = ?", (course_id, instructor_id))
+        return courses[0] if courses else None
+
+    def list_instructor_courses(self, instructor_id: str) -> List[dict]:
+        return self._select_courses("instructor_id = ?", (instructor_id,))
+
+    def list_published_courses(self) -> Iterable[dict]:
+        return self._select_courses("is_published = ?", (True,))
+
+    def update_course(self, course_id: str, fields: dict):
+        unknown = set(fields) - set(COURSE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown course fields: {', '.join(sorted(unknown))}")
+        columns = list(fields)
+        with self._cursor() as cursor:
+            cursor.execute(
+                f"UPDATE courses SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+                (*(_value(fields[column]) for column in columns), course_id)
+            )
+
+    def add_section(self, course_id: str, section: dict, updated_at):
+        with self._cursor() as cursor:
+            self._insert_outline(cursor, course_id, [section])
+            cursor.execute("UPDATE courses SET updated_at = ? WHERE id = ?", (updated_at, course_id))
+
+    def add_chapter(self, course_id: str, section_id: str, chapter: dict, updated_at):
+        with self._cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO chapters ({', '.join(CHAPTER_COLUMNS)}) VALUES ({_placeholders(len(CHAPTER_COLUMNS))})",
+                (chapter["id"], section_id, course_id, chapter["title"], chapter["description"],
+                 chapter.get("video_url"), _value(chapter.get("chapter_type", "free")), chapter.get("price"),
+                 chapter["order"], chapter["created_at"])
+            )
+            cursor.execute("UPDATE courses SET updated_at = ? WHERE id = ?", (updated_at, course_id))
+
+    def update_outline(self, course_id: str, sections: List[dict], changes: dict,
+                       expected_updated_at: datetime, updated_at: datetime) -> Optional[datetime]:
+        with self._cursor() as cursor:
+            # The guarded update also locks the course row until commit
+            cursor.execute(
+                "UPDATE courses SET updated_at = ? WHERE id = ? AND updated_at = ?",
+                (updated_at, course_id, expected_updated_at)
+            )
+            if cursor.rowcount != 1:
+                return None
+
+            section_rows = [
+                (section["title"], section.get("description"), section["order"], section["id"], course_id)
+                for section in sections
+                if section["id"] in changes["sections"]
+            ]
+            if section_rows:
+                cursor.executemany(
+                    "UPDATE sections SET title = ?, description = ?, order_index = ? WHERE id = ? AND course_id = ?",
+                    section_rows
+                )
+            chapter_rows = [
+                (section["id"], chapter["title"], chapter["description"], _value(chapter.get("chapter_type", "free")),
+                 chapter.get("price"), chapter["order"], chapter["id"], course_id)
+                for section in sections
+                for chapter in section["chapters"]
+                if chapter["id"] in changes["chapters"]
+            ]
+            if chapter_rows:
+                cursor.executemany(
+                    "UPDATE chapters SET section_id = ?, title = ?, description = ?, chapter_type = ?, price = ?, "
+                    "order_index = ? WHERE id = ? AND course_id = ?",
+                    chapter_rows
+                )
+
+            # After the moves, so chapters leaving a deleted section survive the cascade
+            for table, ids in (("chapters", changes["deleted_chapters"]), ("sections", changes["deleted_sections"])):
+                for chunk in _chunks(list(ids)):
+                    cursor.execute(
+                        f"DELETE FROM {table} WHERE course_id = ? AND id IN ({_placeholders(len(chunk))})",
+                        (course_id, *chunk)
+                    )
+
+            # As the column holds it, which may be coarser than what was sent
+            cursor.execute("SELECT updated_at FROM courses WHERE id = ?", (course_id,))
+            return _datetime(cursor.fetchone()[0])
+
+    # Published snapshots
+    def get_published_version(self, course_id: str) -> Optional[int]:
+        with self._cursor() as cursor:
+            cursor.execute(
+                "SELECT published_version FROM courses WHERE id = ? AND is_published = ?",
+                (course_id, True)
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def latest_course_version(self, course_id: str) -> Optional[dict]:
+        with self._cursor() as cursor:
+            cursor.execute(
+                "SELECT version, content_hash FROM course_versions WHERE course_id = ? ORDER BY version DESC LIMIT 1",
+                (course_id,)
+            )
+            row = cursor.fetchone()
+        return {"version": row[0], "content_hash": row[1]} if row else None
+
+    def insert_course_version(self, snapshot: dict):
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO course_versions (course_id, version, content_hash, course, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (snapshot["course_id"], snapshot["version"], snapshot["content_hash"],
+                     json.dumps(snapshot["course"], ensure_ascii=False), snapshot["created_at"])
+                )
+        except self.dialect.integrity_errors as e:
+            raise DuplicateError(str(e))
+
+    def get_course_version(self, course_id: str, version: int) -> Optional[dict]:
+        with self._cursor() as cursor:
+            cursor.execute(
+                "SELECT course, content_hash FROM course_versions WHERE course_id = ? AND version = ?",
+                (course_id, version)
+            )
+            row = cursor.fetchone()
+        return {"course": json.loads(row[0]), "content_hash": row[1]} if row else None
+
+    def list_published_snapshots(self) -> List[dict]:
+        with self._cursor() as cursor:
+            cursor.execute(
+                "SELECT v.course FROM courses c "
+                "JOIN course_versions v ON v.course_id = c.id AND v.version = c.published_version "
+                "WHERE c.is_published = ?",
+                (True,)
+            )
+            trees = [json.loads(row[0]) for row in cursor.fetchall()]
+        return trees + self._select_courses("is_published = ? AND published_version IS NULL", (True,))
+
+    # View analytics sketches
+    def get_view_sketch(self, key: str) -> Optional[Tuple[bytes, int]]:
+        with self._cursor() as cursor:
+            cursor.execute("SELECT sketch, revision FROM view_sketches WHERE sketch_key = ?", (key,))
+            row = cursor.fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def get_view_sketches(self, keys: List[str]) -> Dict[str, bytes]:
+        sketches = {}
+        with self._cursor() as cursor:
+            for chunk in _chunks(keys):
+                cursor.execute(
+                    f"SELECT sketch_key, sketch FROM view_sketches WHERE sketch_key IN ({_placeholders(len(chunk))})",
+                    tuple(chunk)
+                )
+                for key, blob in cursor.fetchall():
+                    sketches[key] = bytes(blob)
+        return sketches
+
+    def put_view_sketch(self, key: str, course_id: str, day: str, blob: bytes, revision: Optional[int]) -> bool:
+        try:
+            with self._cursor() as cursor:
+                if revision is None:
+                    cursor.execute(
+                        "INSERT INTO view_sketches (sketch_key, course_id, day, sketch, revision) VALUES (?, ?, ?, ?, 1)",
+                        (key, course_id, day, blob)
+                    )
+                    return True
+                cursor.execute(
+                    "UPDATE view_sketches SET sketch = ?, revision = ? WHERE sketch_key = ? AND revision = ?",
+                    (blob, revision + 1, key, revision)
+                )
+                return cursor.rowcount == 1
+        except self.dialect.integrity_errors:
+            return False
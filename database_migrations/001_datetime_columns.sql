@@ -0,0 +1,22 @@
+-- =====================================================
+-- MIGRATION 001 : dates écrites par l'API en DATETIME(6)
+-- À appliquer sur une base créée avec une version antérieure
+-- de database_schema.sql
+-- =====================================================
+USE elearning_db;
+
+-- L'API fournit toujours ces valeurs (UTC, microsecondes) ;
+-- TIMESTAMP les tronquait à la seconde et les convertissait
+-- selon le fuseau de la session.
+ALTER TABLE users
+    MODIFY created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6);
+
+ALTER TABLE courses
+    MODIFY created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    MODIFY updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6);
+
+ALTER TABLE sections
+    MODIFY created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6);
+
+ALTER TABLE chapters
+    MODIFY created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6);
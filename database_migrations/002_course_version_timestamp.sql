@@ -0,0 +1,10 @@
+-- =====================================================
+-- MIGRATION 002 : courses.updated_at sert de numéro de version
+-- =====================================================
+USE elearning_db;
+
+-- PATCH /api/courses/{id} compare updated_at à la valeur envoyée par
+-- le client : la colonne doit conserver exactement les millisecondes
+-- écrites par l'API et ne jamais être modifiée par ON UPDATE.
+ALTER TABLE courses
+    MODIFY updated_at DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3);
@@ -18,7 +18,7 @@ CREATE TABLE users (
     role ENUM('student', 'instructor', 'admin') DEFAULT 'student',
     full_name VARCHAR(100),
     is_active BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     
     -- Index pour améliorer les performances
@@ -39,8 +39,9 @@ CREATE TABLE courses (
     thumbnail VARCHAR(500),
     price DECIMAL(10,2),
     is_published BOOLEAN DEFAULT FALSE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    published_version INT NULL, -- Version publiée courante (voir course_versions)
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    updated_at DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3), -- Version du plan, écrite par l'API
     
     -- Clés étrangères
     FOREIGN KEY (instructor_id) REFERENCES users(id) ON DELETE CASCADE,
@@ -60,7 +61,7 @@ CREATE TABLE sections (
     title VARCHAR(200) NOT NULL,
     description TEXT,
     order_index INT DEFAULT 0,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     
     -- Clés étrangères
@@ -84,7 +85,7 @@ CREATE TABLE chapters (
     chapter_type ENUM('free', 'paid') DEFAULT 'free',
     price DECIMAL(10,2),
     order_index INT DEFAULT 0,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     
     -- Clés étrangères
@@ -98,6 +99,36 @@ CREATE TABLE chapters (
     INDEX idx_chapters_order (section_id, order_index)
 );
 
+-- =====================================================
+-- TABLE COURSE_VERSIONS (Versions publiées immuables)
+-- =====================================================
+CREATE TABLE course_versions (
+    course_id VARCHAR(36) NOT NULL,
+    version INT NOT NULL,
+    content_hash CHAR(64) NOT NULL,
+    course LONGTEXT NOT NULL, -- Arbre du cours figé au format JSON
+    created_at DATETIME(6) NOT NULL,
+    
+    PRIMARY KEY (course_id, version),
+    
+    -- Clés étrangères
+    FOREIGN KEY (course_id) REFERENCES courses(id) ON DELETE CASCADE
+);
+
+-- =====================================================
+-- TABLE VIEW_SKETCHES (Statistiques de vues approximatives)
+-- =====================================================
+CREATE TABLE view_sketches (
+    sketch_key VARCHAR(255) PRIMARY KEY, -- course:{id}:{jour} ou chapter:{id}:{chapitre}:{jour}
+    course_id VARCHAR(36) NOT NULL,
+    day VARCHAR(10) NOT NULL,
+    sketch LONGBLOB NOT NULL, -- HyperLogLog et count-min sérialisés
+    revision INT NOT NULL, -- Compteur pour les mises à jour concurrentes
+    
+    -- Index
+    INDEX idx_view_sketches_course_day (course_id, day)
+);
+
 -- =====================================================
 -- TABLE PURCHASES (Achats)
 -- =====================================================
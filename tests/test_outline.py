@@ -0,0 +1,100 @@
+import pytest
+
+from outline import OutlineError, _diff, apply_outline_operations
+
+def make_sections():
+    return [
+        {"id": "s1", "title": "One", "order": 0, "chapters": [
+            {"id": "c1", "title": "A", "order": 0},
+            {"id": "c2", "title": "B", "order": 1},
+            {"id": "c3", "title": "C", "order": 2},
+        ]},
+        {"id": "s2", "title": "Two", "order": 1, "chapters": [
+            {"id": "c4", "title": "D", "order": 0},
+        ]},
+        {"id": "s3", "title": "Three", "order": 2, "chapters": []},
+    ]
+
+def outline(sections):
+    return [(section["id"], [chapter["id"] for chapter in section["chapters"]]) for section in sections]
+
+def orders(sections):
+    return [(section["order"], [chapter["order"] for chapter in section["chapters"]]) for section in sections]
+
+def test_move():
+    sections, changes = apply_outline_operations(make_sections(), [
+        {"op": "move", "chapter_id": "c1", "section_id": "s2", "position": 0},
+    ])
+    assert outline(sections) == [("s1", ["c2", "c3"]), ("s2", ["c1", "c4"]), ("s3", [])]
+    assert orders(sections) == [(0, [0, 1]), (1, [0, 1]), (2, [])]
+    assert changes == {
+        "sections": {"s1", "s2"}, "chapters": {"c1", "c2", "c3", "c4"},
+        "deleted_sections": set(), "deleted_chapters": set(),
+    }
+
+def test_move_without_position_appends():
+    sections, _ = apply_outline_operations(make_sections(), [
+        {"op": "move", "chapter_id": "c4", "section_id": "s1"},
+    ])
+    assert outline(sections) == [("s1", ["c1", "c2", "c3", "c4"]), ("s2", []), ("s3", [])]
+
+def test_reorder():
+    sections, changes = apply_outline_operations(make_sections(), [
+        {"op": "reorder", "chapter_id": "c3", "position": 0},
+        {"op": "reorder", "section_id": "s3", "position": 0},
+    ])
+    assert outline(sections) == [("s3", []), ("s1", ["c3", "c1", "c2"]), ("s2", ["c4"])]
+    assert orders(sections) == [(0, []), (1, [0, 1, 2]), (2, [0])]
+    assert changes["sections"] == {"s1", "s2", "s3"}
+    assert changes["chapters"] == {"c1", "c2", "c3"}
+
+def test_delete_compacts_order():
+    sections, changes = apply_outline_operations(make_sections(), [
+        {"op": "delete", "chapter_id": "c2"},
+        {"op": "delete", "section_id": "s1"},
+    ])
+    assert outline(sections) == [("s2", ["c4"]), ("s3", [])]
+    assert orders(sections) == [(0, [0]), (1, [])]
+    assert changes == {
+        "sections": {"s2", "s3"}, "chapters": set(),
+        "deleted_sections": {"s1"}, "deleted_chapters": {"c1", "c2", "c3"},
+    }
+
+def test_move_out_of_deleted_section():
+    sections, changes = apply_outline_operations(make_sections(), [
+        {"op": "move", "chapter_id": "c2", "section_id": "s3"},
+        {"op": "delete", "section_id": "s1"},
+    ])
+    assert outline(sections) == [("s2", ["c4"]), ("s3", ["c2"])]
+    assert changes["chapters"] == {"c2"}
+    assert changes["deleted_sections"] == {"s1"}
+    assert changes["deleted_chapters"] == {"c1", "c3"}
+
+def test_input_is_not_modified():
+    original = make_sections()
+    apply_outline_operations(original, [
+        {"op": "rename", "chapter_id": "c1", "title": "Renamed"},
+        {"op": "move", "chapter_id": "c1", "section_id": "s3"},
+    ])
+    assert original == make_sections()
+
+def test_unknown_ids():
+    with pytest.raises(OutlineError) as error:
+        apply_outline_operations(make_sections(), [
+            {"op": "delete", "chapter_id": "c1"},
+            {"op": "rename", "chapter_id": "c1", "title": "Gone"},
+        ])
+    assert error.value.status_code == 404
+    assert str(error.value).startswith("Operation 1:")
+
+def test_diff_without_changes():
+    assert _diff(make_sections(), make_sections()) == {
+        "sections": set(), "chapters": set(), "deleted_sections": set(), "deleted_chapters": set(),
+    }
+
+def test_diff_field_change_marks_parent_section():
+    new = make_sections()
+    new[1]["chapters"][0]["title"] = "Changed"
+    changes = _diff(make_sections(), new)
+    assert changes["sections"] == {"s2"}
+    assert changes["chapters"] == {"c4"}
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import threading
+import time
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from profiling import ProfilingMiddleware, SamplingProfiler, prune_profiles
+
+def busy_request(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def busy_elsewhere(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+async def yielding(busy, seconds):
+    # Each slice outlasts the GIL switch interval, so samples land inside it
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        busy(0.02)
+        await asyncio.sleep(0)
+
+def make_client(directory):
+    async def in_threadpool(request):
+        await run_in_threadpool(busy_request, 0.3)
+        return PlainTextResponse("done")
+
+    async def on_loop(request):
+        # Another task shares the event loop with this request
+        other = asyncio.create_task(yielding(busy_elsewhere, 0.3))
+        await yielding(busy_request, 0.3)
+        await other
+        return PlainTextResponse("done")
+
+    app = Starlette(routes=[Route("/threadpool", in_threadpool), Route("/loop", on_loop)])
+    app = ProfilingMiddleware(app, authorize=lambda token: token == "admin", directory=str(directory), interval_ms=2)
+    return TestClient(app)
+
+def profile_request(directory, path):
+    response = make_client(directory).get(path, headers={"X-Profile": "1", "Authorization": "Bearer admin"})
+    profile_path = os.path.join(directory, response.headers["x-profile-file"])
+    # The profiler thread writes the file after the response
+    for _ in range(100):
+        if os.path.exists(profile_path):
+            break
+        time.sleep(0.02)
+    with open(profile_path) as f:
+        return f.read()
+
+def test_profiles_only_the_requests_threadpool_jobs(tmp_path):
+    other = threading.Thread(target=busy_elsewhere, args=(0.5,), daemon=True)
+    other.start()
+    profile = profile_request(tmp_path, "/threadpool")
+    other.join()
+
+    assert "busy_request" in profile
+    assert "busy_elsewhere" not in profile
+
+def test_profiles_only_the_requests_coroutine(tmp_path):
+    profile = profile_request(tmp_path, "/loop")
+
+    assert "busy_request" in profile
+    assert "busy_elsewhere" not in profile
+
+def test_unauthorized_requests_are_not_profiled(tmp_path):
+    response = make_client(tmp_path).get("/threadpool", headers={"X-Profile": "1", "Authorization": "Bearer student"})
+
+    assert response.text == "done"
+    assert "x-profile-file" not in response.headers
+
+def test_stop_leaves_the_write_to_the_profiler_thread(tmp_path):
+    profiler = SamplingProfiler(interval_ms=1)
+    profiler.start()
+    time.sleep(0.02)
+    profiler.stop(str(tmp_path / "one.folded"))
+    profiler.join()
+
+    assert (tmp_path / "one.folded").exists()
+
+def test_prune_keeps_newest(tmp_path):
+    for index in range(5):
+        path = tmp_path / f"{index}.folded"
+        path.write_text("")
+        os.utime(path, (index, index))
+    (tmp_path / "notes.txt").write_text("")
+
+    prune_profiles(str(tmp_path), keep=2)
+    assert sorted(os.listdir(tmp_path)) == ["3.folded", "4.folded", "notes.txt"]
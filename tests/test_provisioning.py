@@ -0,0 +1,117 @@
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from provisioning import iter_records, ndjson_report, provision_users
+
+class UserCreate(BaseModel):
+    username: str
+    email: str
+    password: str
+    role: str = "student"
+    full_name: Optional[str] = None
+
+class StubStorage:
+    """Users already registered, plus emails whose insert fails"""
+
+    def __init__(self, emails=(), usernames=(), failing=()):
+        self.emails = set(emails)
+        self.usernames = set(usernames)
+        self.failing = set(failing)
+        self.lookups = 0
+        self.inserted = []
+
+    def existing_users(self, emails, usernames):
+        self.lookups += 1
+        return self.emails & set(emails), self.usernames & set(usernames)
+
+    def insert_users(self, users):
+        errors = {}
+        for index, user in enumerate(users):
+            if user["email"] in self.failing:
+                errors[index] = "E11000 duplicate key"
+            else:
+                self.inserted.append(user)
+        return errors
+
+@pytest.fixture
+def pool():
+    with ThreadPoolExecutor(2) as pool:
+        yield pool
+
+def hasher(password):
+    return "hashed:" + password
+
+def csv_records(*rows):
+    text = "username,email,password\n" + "".join(f"{row}\n" for row in rows)
+    return iter_records(io.BytesIO(text.encode()), "csv")
+
+def provision(storage, records, pool, batch_size=2):
+    *results, counts = provision_users(storage, records, UserCreate, hasher, batch_size=batch_size, pool=pool)
+    return results, counts
+
+def test_creates_users(pool):
+    storage = StubStorage()
+    results, counts = provision(storage, csv_records("ann,ann@x,pw1", "bob,bob@x,pw2", "cat,cat@x,pw3"), pool)
+
+    assert counts == {"created": 3, "duplicates": 0, "invalid": 0, "errors": 0}
+    assert [(result["row"], result["status"]) for result in results] == [(1, "created"), (2, "created"), (3, "created")]
+    assert [user["password"] for user in storage.inserted] == ["hashed:pw1", "hashed:pw2", "hashed:pw3"]
+    assert {result["id"] for result in results} == {user["id"] for user in storage.inserted}
+    # One duplicate lookup per batch
+    assert storage.lookups == 2
+
+def test_duplicates_within_file(pool):
+    storage = StubStorage()
+    results, counts = provision(storage, csv_records(
+        "ann,ann@x,pw", "bob,ann@x,pw", "ann,other@x,pw", "dan,dan@x,pw"
+    ), pool)
+
+    assert counts == {"created": 2, "duplicates": 2, "invalid": 0, "errors": 0}
+    assert [(result["status"], result.get("detail")) for result in results] == [
+        ("created", None),
+        ("duplicate", "Email repeated in upload"),
+        ("duplicate", "Username repeated in upload"),
+        ("created", None),
+    ]
+
+def test_duplicates_of_existing_users(pool):
+    storage = StubStorage(emails={"ann@x"}, usernames={"bob"})
+    results, counts = provision(storage, csv_records("ann,ann@x,pw", "bob,bob@x,pw", "cat,cat@x,pw"), pool)
+
+    assert counts == {"created": 1, "duplicates": 2, "invalid": 0, "errors": 0}
+    assert [result.get("detail") for result in results] == ["Email already registered", "Username already taken", None]
+    assert [user["email"] for user in storage.inserted] == ["cat@x"]
+
+def test_invalid_rows(pool):
+    text = '{"username": "ann", "email": "ann@x", "password": "pw"}\nnot json\n[1]\n{"username": "bob"}\n'
+    results, counts = provision(StubStorage(), iter_records(io.BytesIO(text.encode()), "ndjson"), pool)
+
+    assert counts == {"created": 1, "duplicates": 0, "invalid": 3, "errors": 0}
+    assert [(result["row"], result["status"]) for result in results] == [
+        (1, "created"), (2, "invalid"), (3, "invalid"), (4, "invalid"),
+    ]
+    assert results[1]["detail"].startswith("Invalid JSON")
+    assert results[2]["detail"] == "Row must be a JSON object"
+
+def test_write_errors(pool):
+    storage = StubStorage(failing={"bob@x"})
+    results, counts = provision(storage, csv_records("ann,ann@x,pw", "bob,bob@x,pw"), pool)
+
+    assert counts == {"created": 1, "duplicates": 0, "invalid": 0, "errors": 1}
+    assert results[1] == {"row": 2, "email": "bob@x", "status": "error", "detail": "E11000 duplicate key"}
+    assert [user["email"] for user in storage.inserted] == ["ann@x"]
+
+def test_ndjson_report_is_written_per_batch(pool):
+    records = csv_records(*(f"u{index},u{index}@x,pw" for index in range(5)))
+    results = provision_users(StubStorage(), records, UserCreate, hasher, batch_size=2, pool=pool)
+    chunks = list(ndjson_report(results, batch_size=2))
+
+    assert [chunk.count("\n") for chunk in chunks] == [2, 2, 2]
+    lines = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert [line["row"] for line in lines[:-1]] == [1, 2, 3, 4, 5]
+    assert lines[-1] == {"created": 5, "duplicates": 0, "invalid": 0, "errors": 0}
@@ -0,0 +1,99 @@
+import random
+
+import numpy as np
+import pytest
+
+from recommendations import RelatedCoursesModel
+
+WORDS = [f"topic{index}" for index in range(80)]
+
+def make_catalog(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"course-{index}",
+            "title": " ".join(rng.sample(WORDS, 3)),
+            "description": " ".join(rng.choices(WORDS, k=12)),
+            "sections": [{"chapters": [{"title": " ".join(rng.sample(WORDS, 2))} for _ in range(3)]}],
+        }
+        for index in range(count)
+    ]
+
+def positive_neighbours(neighbours, scores):
+    """Each row's neighbours with a positive score, as {column: score}"""
+    return [
+        {int(column): float(score) for column, score in zip(row_neighbours, row_scores) if column >= 0 and score > 0}
+        for row_neighbours, row_scores in zip(neighbours, scores)
+    ]
+
+def assert_same_table(actual, expected):
+    assert len(actual) == len(expected)
+    for row, (got, want) in enumerate(zip(actual, expected)):
+        assert sorted(got.values(), reverse=True) == pytest.approx(sorted(want.values(), reverse=True), abs=1e-5), row
+        # Neighbours may only differ where their scores tie
+        for column in set(got) ^ set(want):
+            score = got.get(column, want.get(column))
+            assert score == pytest.approx(min(want.values()), abs=1e-5), row
+
+def rebuilt_table(model):
+    neighbours, scores = model._top_k_table(model.matrix)
+    return positive_neighbours(neighbours, scores)
+
+def test_upserted_courses_match_a_full_ranking():
+    catalog = make_catalog(60)
+    model = RelatedCoursesModel(top_k=5, batch_size=7)
+    model.build(catalog[:30])
+    for course in catalog[30:]:
+        model.upsert(course)
+
+    assert model.ids == [course["id"] for course in catalog]
+    assert_same_table(positive_neighbours(model.neighbours, model.scores), rebuilt_table(model))
+
+def test_upserting_unchanged_courses_keeps_the_table():
+    catalog = make_catalog(40)
+    model = RelatedCoursesModel(top_k=5, batch_size=7)
+    model.build(catalog)
+    built = positive_neighbours(model.neighbours, model.scores)
+    for course in reversed(catalog):
+        model.upsert(course)
+
+    assert_same_table(positive_neighbours(model.neighbours, model.scores), built)
+
+def test_dense_and_sparse_top_k_agree():
+    model = RelatedCoursesModel(top_k=5)
+    model.build(make_catalog(50))
+    transposed = model.matrix.T.tocsr()
+    for start in range(0, 50, 16):
+        similarity = model.matrix[start:start + 16] @ transposed
+        dense = RelatedCoursesModel._dense_top_k(similarity.toarray(), start, 5)
+        sparse = RelatedCoursesModel._sparse_top_k(similarity.tocsr(), start, 5)
+
+        assert_same_table(positive_neighbours(*sparse), positive_neighbours(*dense))
+        rows = np.arange(dense[0].shape[0])
+        assert not np.any(dense[0] == (rows + start)[:, None])
+        assert not np.any(sparse[0] == (rows + start)[:, None])
+
+def test_related_returns_cards_by_score():
+    catalog = make_catalog(20)
+    catalog.append({**catalog[0], "id": "copy-of-0"})
+    model = RelatedCoursesModel(top_k=5)
+    model.build(catalog)
+
+    related = model.related("course-0", limit=3)
+    assert len(related) == 3
+    assert related[0]["id"] == "copy-of-0"
+    assert related[0]["score"] == pytest.approx(1.0)
+    assert [card["score"] for card in related] == sorted((card["score"] for card in related), reverse=True)
+    assert model.related("unknown") == []
+
+def test_upserts_during_a_build_are_replayed():
+    catalog = make_catalog(10)
+    late = make_catalog(11, seed=8)[10]
+    late["id"] = "late"
+
+    model = RelatedCoursesModel(top_k=3)
+    model._building = True
+    model.upsert(late)
+    model.build(catalog)
+
+    assert "late" in model.index
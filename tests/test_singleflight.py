@@ -0,0 +1,126 @@
+import asyncio
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+class Loader:
+    """A load that counts its calls and can be held open until released"""
+
+    def __init__(self, name="value", block=False):
+        self.name = name
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        return f"{self.name}-{self.calls}"
+
+async def wait_started(loader):
+    assert await asyncio.to_thread(loader.started.wait, 5)
+
+def test_concurrent_reads_share_one_load():
+    async def scenario():
+        flight = SingleFlight(ttl_ms=10_000)
+        loader = Loader(block=True)
+        first = asyncio.ensure_future(flight.get("course", loader))
+        await wait_started(loader)
+        others = [asyncio.ensure_future(flight.get("course", loader)) for _ in range(4)]
+        loader.release.set()
+        return flight, loader, await asyncio.gather(first, *others)
+
+    flight, loader, values = asyncio.run(scenario())
+    assert values == ["value-1"] * 5
+    assert loader.calls == 1
+    assert flight.stats()["loads"] == 1
+    assert flight.stats()["coalesced"] == 4
+
+def test_values_expire_after_the_ttl():
+    async def scenario():
+        flight = SingleFlight(ttl_ms=50)
+        loader = Loader()
+        first = await flight.get("course", loader)
+        cached = await flight.get("course", loader)
+        await asyncio.sleep(0.1)
+        reloaded = await flight.get("course", loader)
+        return flight, loader, (first, cached, reloaded)
+
+    flight, loader, values = asyncio.run(scenario())
+    assert values == ("value-1", "value-1", "value-2")
+    assert loader.calls == 2
+    assert flight.stats()["hits"] == 1
+
+def test_invalidate_while_loading_does_not_store_the_value():
+    async def scenario():
+        flight = SingleFlight(ttl_ms=10_000)
+        loader = Loader(block=True)
+        waiting = asyncio.ensure_future(flight.get("course", loader))
+        await wait_started(loader)
+        flight.invalidate("course")
+        loader.release.set()
+        stale = await waiting
+        fresh = await flight.get("course", loader)
+        return flight, loader, (stale, fresh)
+
+    flight, loader, values = asyncio.run(scenario())
+    # The waiter still gets its value, but the next read loads again
+    assert values == ("value-1", "value-2")
+    assert loader.calls == 2
+    assert flight.stats()["entries"] == 1
+
+def test_invalidate_while_loading_starts_a_fresh_load_for_new_callers():
+    async def scenario():
+        flight = SingleFlight(ttl_ms=10_000)
+        stale_loader = Loader("stale", block=True)
+        fresh_loader = Loader("fresh")
+        stale = asyncio.ensure_future(flight.get("course", stale_loader))
+        await wait_started(stale_loader)
+        flight.invalidate("course")
+        fresh = await flight.get("course", fresh_loader)
+        stale_loader.release.set()
+        await stale
+        cached = await flight.get("course", stale_loader)
+        return fresh, cached
+
+    fresh, cached = asyncio.run(scenario())
+    # The stale load finishing last must not overwrite the fresh value
+    assert fresh == cached == "fresh-1"
+
+def test_failed_loads_are_not_cached():
+    calls = []
+
+    def flaky():
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+        return "value"
+
+    async def scenario():
+        flight = SingleFlight(ttl_ms=10_000)
+        with pytest.raises(RuntimeError):
+            await flight.get("course", flaky)
+        return flight, await flight.get("course", flaky)
+
+    flight, value = asyncio.run(scenario())
+    assert value == "value"
+    assert len(calls) == 2
+    assert flight.stats()["entries"] == 1
+
+def test_oldest_entries_are_evicted_past_the_limit():
+    async def scenario():
+        flight = SingleFlight(ttl_ms=10_000, max_entries=2)
+        for key in ("a", "b", "c"):
+            await flight.get(key, Loader())
+        loader = Loader()
+        await flight.get("a", loader)
+        return flight, loader
+
+    flight, loader = asyncio.run(scenario())
+    assert loader.calls == 1
+    assert flight.stats()["entries"] == 2
@@ -0,0 +1,99 @@
+import math
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+from scipy.stats import chi2
+
+from sketches import CHAPTER_HLL_PRECISION, COURSE_HLL_PRECISION, CountMinSketch, HyperLogLog, ViewSketch
+
+TRIALS = 10
+
+def hyperloglog_errors(precision, cardinality, seed):
+    errors = []
+    for trial in range(TRIALS):
+        sketch = HyperLogLog(precision)
+        for index in range(cardinality):
+            sketch.add(f"learner-{seed}-{trial}-{index}")
+        errors.append(sketch.count() / cardinality - 1)
+    return np.asarray(errors)
+
+@pytest.mark.parametrize("precision", [COURSE_HLL_PRECISION, CHAPTER_HLL_PRECISION])
+@pytest.mark.parametrize("cardinality", [100, 1000, 10000])
+def test_hyperloglog_error_within_stated_bound(precision, cardinality):
+    bound = HyperLogLog(precision).standard_error
+    errors = hyperloglog_errors(precision, cardinality, seed=7)
+    # Estimates are whole learners, which is a coarser step than the bound at small n
+    rounding = 1 / cardinality
+    rms_limit = bound * math.sqrt(chi2.ppf(0.999, TRIALS) / TRIALS) + rounding
+
+    assert np.sqrt(np.mean(np.square(errors))) <= rms_limit
+    assert np.max(np.abs(errors)) <= 4 * bound + rounding
+
+def test_hyperloglog_ignores_repeats():
+    sketch = HyperLogLog(COURSE_HLL_PRECISION)
+    assert sketch.count() == 0
+    for index in range(500):
+        sketch.add(f"learner-{index}")
+    estimate = sketch.count()
+    for index in range(500):
+        sketch.add(f"learner-{index}")
+    assert sketch.count() == estimate
+
+def test_hyperloglog_precision_mismatch():
+    with pytest.raises(ValueError):
+        HyperLogLog(COURSE_HLL_PRECISION).merge(HyperLogLog(CHAPTER_HLL_PRECISION))
+
+def test_count_min_never_undercounts():
+    rng = random.Random(7)
+    chapters = [f"chapter-{index}" for index in range(300)]
+    stream = rng.choices(chapters, [1 / (rank + 1) for rank in range(len(chapters))], k=50000)
+    exact = Counter(stream)
+    sketch = CountMinSketch()
+    for chapter_id in stream:
+        sketch.add(chapter_id)
+
+    overcounts = [sketch.estimate(chapter_id) - count for chapter_id, count in exact.items()]
+    assert min(overcounts) >= 0
+    over_limit = sum(overcount > sketch.epsilon * len(stream) for overcount in overcounts)
+    assert over_limit / len(exact) <= sketch.delta
+    assert sketch.estimate("chapter-never-viewed") <= sketch.epsilon * len(stream)
+
+def test_merge_matches_single_sketch_through_bytes():
+    rng = random.Random(7)
+    events = [(f"learner-{rng.randrange(2000)}", f"chapter-{rng.randrange(200)}") for _ in range(20000)]
+    combined = ViewSketch(COURSE_HLL_PRECISION, with_chapters=True)
+    for learner, chapter_id in events:
+        combined.record(learner, chapter_id)
+
+    # Four workers over three days, each stored as a blob and merged back
+    merged = ViewSketch(COURSE_HLL_PRECISION, with_chapters=True)
+    for part in range(12):
+        worker = ViewSketch(COURSE_HLL_PRECISION, with_chapters=True)
+        for learner, chapter_id in events[part::12]:
+            worker.record(learner, chapter_id)
+        merged.merge(ViewSketch.from_bytes(worker.to_bytes()))
+
+    assert merged.views == combined.views == len(events)
+    assert np.array_equal(merged.learners.registers, combined.learners.registers)
+    assert np.array_equal(merged.chapters.table, combined.chapters.table)
+
+    restored = ViewSketch.from_bytes(merged.to_bytes())
+    assert restored.views == merged.views
+    assert restored.learners.count() == merged.learners.count()
+    assert np.array_equal(restored.chapters.table, merged.chapters.table)
+
+def test_chapter_sketch_round_trip():
+    sketch = ViewSketch(CHAPTER_HLL_PRECISION)
+    for index in range(300):
+        sketch.record(f"learner-{index % 120}")
+    restored = ViewSketch.from_bytes(sketch.to_bytes())
+
+    assert restored.chapters is None
+    assert restored.views == 300
+    assert np.array_equal(restored.learners.registers, sketch.learners.registers)
+
+def test_from_bytes_rejects_other_blobs():
+    with pytest.raises(ValueError):
+        ViewSketch.from_bytes(b"not a sketch")
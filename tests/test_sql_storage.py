@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from outline import apply_outline_operations
+from storage import DuplicateError
+from storage.sql import SQLiteDialect, SQLStorage
+
+CREATED = datetime(2024, 3, 1, 9, 30, 0, 123456)
+VERSION = datetime(2024, 3, 1, 9, 30, 0, 123000)
+
+def make_chapter(chapter_id, order, **fields):
+    return {
+        "id": chapter_id, "title": f"Chapter {chapter_id}", "description": "", "video_url": None,
+        "chapter_type": "free", "price": None, "order": order, "created_at": CREATED, **fields,
+    }
+
+def make_course():
+    return {
+        "id": "course-1", "title": "Course", "description": "About", "instructor_id": "teacher-1",
+        "instructor_name": "Teacher", "thumbnail": None, "price": 49.5, "is_published": False,
+        "published_version": None, "created_at": CREATED, "updated_at": VERSION,
+        "sections": [
+            {"id": "s1", "title": "One", "description": "First", "order": 0, "created_at": CREATED, "chapters": [
+                make_chapter("c1", 0), make_chapter("c2", 1, chapter_type="paid", price=9.99),
+            ]},
+            {"id": "s2", "title": "Two", "description": None, "order": 1, "created_at": CREATED, "chapters": [
+                make_chapter("c3", 0),
+            ]},
+        ],
+    }
+
+@pytest.fixture
+def store():
+    store = SQLStorage(SQLiteDialect(":memory:"))
+    store.setup()
+    store.insert_user({
+        "id": "teacher-1", "username": "teacher", "email": "teacher@example.com", "password": "x",
+        "role": "instructor", "full_name": "Teacher", "is_active": True, "created_at": CREATED,
+    })
+    yield store
+    store.close()
+
+def outline(course):
+    return [(section["id"], [chapter["id"] for chapter in section["chapters"]]) for section in course["sections"]]
+
+def test_course_round_trip(store):
+    course = make_course()
+    store.insert_course(course)
+
+    assert store.get_course("course-1") == course
+    assert store.get_course("course-1", instructor_id="teacher-1") == course
+    assert store.get_course("course-1", instructor_id="someone-else") is None
+    assert store.list_instructor_courses("teacher-1") == [course]
+    assert store.list_published_courses() == []
+
+def test_duplicate_user(store):
+    with pytest.raises(DuplicateError):
+        store.insert_user({
+            "id": "teacher-2", "username": "teacher", "email": "other@example.com", "password": "x",
+            "role": "instructor", "full_name": None, "is_active": True, "created_at": CREATED,
+        })
+
+def test_update_outline(store):
+    store.insert_course(make_course())
+    sections, changes = apply_outline_operations(make_course()["sections"], [
+        {"op": "rename", "chapter_id": "c3", "title": "Renamed"},
+        {"op": "reorder", "section_id": "s2", "position": 0},
+    ])
+    new_version = VERSION + timedelta(milliseconds=1)
+
+    assert store.update_outline("course-1", sections, changes, VERSION, new_version) == new_version
+    course = store.get_course("course-1")
+    assert outline(course) == [("s2", ["c3"]), ("s1", ["c1", "c2"])]
+    assert course["sections"][0]["chapters"][0]["title"] == "Renamed"
+    assert course["updated_at"] == new_version
+
+def test_update_outline_stale_version(store):
+    store.insert_course(make_course())
+    sections, changes = apply_outline_operations(make_course()["sections"], [
+        {"op": "delete", "section_id": "s2"},
+    ])
+    stale = VERSION - timedelta(milliseconds=1)
+
+    assert store.update_outline("course-1", sections, changes, stale, VERSION + timedelta(seconds=1)) is None
+    assert store.get_course("course-1") == make_course()
+
+def test_update_outline_deletes(store):
+    store.insert_course(make_course())
+    sections, changes = apply_outline_operations(make_course()["sections"], [
+        {"op": "delete", "chapter_id": "c1"},
+        {"op": "move", "chapter_id": "c2", "section_id": "s2"},
+        {"op": "delete", "section_id": "s1"},
+    ])
+
+    assert store.update_outline("course-1", sections, changes, VERSION, VERSION + timedelta(seconds=1))
+    course = store.get_course("course-1")
+    # c2 left s1 before it was deleted, so the cascade does not take it
+    assert outline(course) == [("s2", ["c3", "c2"])]
+    assert [chapter["order"] for chapter in course["sections"][0]["chapters"]] == [0, 1]
+    assert course["sections"][0]["order"] == 0
+    assert course["sections"][0]["chapters"][1]["price"] == 9.99